@@ -1,33 +1,210 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, has_request_context, jsonify, request, stream_with_context
 from flask_httpauth import HTTPBasicAuth
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_talisman import Talisman
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer
+from sqlalchemy.engine import Engine
 import requests
 import os
+import json
+import csv
+import io
+import hmac
+import hashlib
+import secrets
+import sqlite3
+import gzip
+import math
+import re
+from array import array
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import brotli
+except ImportError:  # optional; responses fall back to gzip
+    brotli = None
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
+from upstream import RateLimited, TokenBucket, ConcurrentFetcher, SingleFlight
+import ratelimit_storage  # noqa: F401 - registers the sqlite:// rate-limit storage
+from metrics import Registry
+from search_index import LibrarySearch
+from warmup import WarmupScheduler
+from library_query import (LibraryIndex, ViewSnapshots, SORT_OPTIONS, DATE_RANGES, PLAYED, flags_from_args,
+                           compare_indexes, encode_cursor, decode_cursor, recent_day, DAY)
 
 app = Flask(__name__, static_folder='static', static_url_path='')
 
+# Load environment variables from .env file
+load_dotenv()
+
 # Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///C:/steam-library-fetcher/users.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL", 'sqlite:///C:/steam-library-fetcher/users.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
 
+@db.event.listens_for(Engine, 'connect')
+def configure_sqlite(dbapi_connection, connection_record):
+    # WAL lets readers proceed while another thread or worker process writes to the caches
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA busy_timeout=30000')
+        cursor.close()
+
 # Initialize HTTP Basic Authentication
 auth = HTTPBasicAuth()
 
-# Load environment variables from .env file
-load_dotenv()
 API_KEY = os.getenv("STEAM_API_KEY")
 if not API_KEY:
     raise ValueError("Steam API key not found in .env file")
 
+# Upstream base URLs; point them at benchmarks/fake_steam.py to run without the real Steam API
+STEAM_API_BASE = os.getenv("STEAM_API_BASE", "http://api.steampowered.com").rstrip('/')
+STEAM_STORE_BASE = os.getenv("STEAM_STORE_BASE", "https://store.steampowered.com").rstrip('/')
+
+# Multi-process deployments: SERVER_PROCESSES processes share the Steam API key, so each takes that fraction
+# of the upstream budgets; background threads run only in the process holding BACKGROUND_LOCK_FILE
+SERVER_PROCESSES = max(1, int(os.getenv("SERVER_PROCESSES", 1)))
+BACKGROUND_LOCK_FILE = os.getenv("BACKGROUND_LOCK_FILE", "background.lock")
+BACKGROUND_LOCK_RETRY = 30  # seconds between attempts to take over from a process that exited
+
+# Verified-credential cache configuration; other workers see User changes within AUTH_CACHE_TTL
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", 5 * 60))  # seconds
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 1024))
+
+# Owned-games cache configuration
+LIBRARY_CACHE_TTL = int(os.getenv("LIBRARY_CACHE_TTL", 600))  # seconds
+LIBRARY_CACHE_MAX_BYTES = int(os.getenv("LIBRARY_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+LIBRARY_ACCESS_RESOLUTION = int(os.getenv("LIBRARY_ACCESS_RESOLUTION", 60))  # seconds; last_accessed is rewritten at most this often
+LIBRARY_INDEX_CACHE_SIZE = int(os.getenv("LIBRARY_INDEX_CACHE_SIZE", 64))  # parsed libraries kept in memory
+LIBRARY_SNAPSHOT_TTL = int(os.getenv("LIBRARY_SNAPSHOT_TTL", 15 * 60))  # seconds an unused paging cursor stays valid
+LIBRARY_SNAPSHOT_MAX_BYTES = int(os.getenv("LIBRARY_SNAPSHOT_MAX_BYTES", 64 * 1024 * 1024))  # positions plus the libraries they pin
+
+# Vanity-name resolution cache configuration
+VANITY_CACHE_TTL = int(os.getenv("VANITY_CACHE_TTL", 7 * 24 * 60 * 60))  # seconds
+VANITY_NEGATIVE_TTL = int(os.getenv("VANITY_NEGATIVE_TTL", 10 * 60))  # seconds
+
+# App-details store configuration
+APP_DETAILS_TTL = int(os.getenv("APP_DETAILS_TTL", 7 * 24 * 60 * 60))  # seconds
+APP_DETAILS_NEGATIVE_TTL = int(os.getenv("APP_DETAILS_NEGATIVE_TTL", 24 * 60 * 60))  # seconds
+
+# Store API fetch engine configuration (the store allows roughly 200 appdetails calls per 5 minutes)
+STORE_API_RATE = float(os.getenv("STORE_API_RATE", 200 / 300))  # requests per second
+STORE_API_BURST = int(os.getenv("STORE_API_BURST", 20))
+DETAILS_FETCH_WORKERS = int(os.getenv("DETAILS_FETCH_WORKERS", 8))
+DETAILS_FETCH_TIMEOUT = float(os.getenv("DETAILS_FETCH_TIMEOUT", 20))  # seconds a request waits for new details
+DETAILS_REFRESH_WORKERS = int(os.getenv("DETAILS_REFRESH_WORKERS", 1))
+DETAILS_REFRESH_MAX_PENDING = int(os.getenv("DETAILS_REFRESH_MAX_PENDING", 500))  # stale entries queued for refresh at once
+
+# Achievements cache and Web API fetch budget (Steam allows 100,000 Web API calls per key per day)
+ACHIEVEMENT_CACHE_TTL = int(os.getenv("ACHIEVEMENT_CACHE_TTL", 60 * 60))  # seconds
+WEB_API_RATE = float(os.getenv("WEB_API_RATE", 100000 / 86400))  # requests per second
+WEB_API_BURST = int(os.getenv("WEB_API_BURST", 50))
+ACHIEVEMENT_FETCH_WORKERS = int(os.getenv("ACHIEVEMENT_FETCH_WORKERS", 8))
+ACHIEVEMENT_FETCH_TIMEOUT = float(os.getenv("ACHIEVEMENT_FETCH_TIMEOUT", 20))  # seconds a request waits for new results
+BULK_ACHIEVEMENTS_MAX_APPIDS = 1000
+BULK_ACHIEVEMENTS_MAX_PLAYED = int(os.getenv("BULK_ACHIEVEMENTS_MAX_PLAYED", 200))  # most played games looked up for appids=played
+# Fraction of WEB_API_RATE achievement lookups may use; the rest of the key's quota is left to library
+# and vanity lookups, which aren't metered, and to warm-up
+ACHIEVEMENTS_API_SHARE = float(os.getenv("ACHIEVEMENTS_API_SHARE", 0.5))
+
+# Library stats configuration
+LIBRARY_STATS_MAX_TOP = 100
+
+# HTTP caching and compression
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", 365 * 24 * 60 * 60))  # seconds, for content-hashed asset URLs
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/javascript', 'text/javascript', 'text/css',
+                          'text/html', 'text/plain', 'image/svg+xml'}
+
+# Library comparison configuration
+COMPARE_MAX_PROFILES = int(os.getenv("COMPARE_MAX_PROFILES", 20))
+PROFILE_FETCH_WORKERS = int(os.getenv("PROFILE_FETCH_WORKERS", 8))
+
+# Cross-library search configuration
+SEARCH_MAX_PROFILES = int(os.getenv("SEARCH_MAX_PROFILES", 50))
+SEARCH_MAX_RESULTS = 100
+
+# Playtime history configuration; HISTORY_WATCH_IDS seeds the watched SteamID64s (comma-separated)
+HISTORY_SYNC_INTERVAL = int(os.getenv("HISTORY_SYNC_INTERVAL", 6 * 60 * 60))  # seconds between snapshots; 0 disables the sync thread
+HISTORY_WATCH_IDS = [steam_id.strip() for steam_id in os.getenv("HISTORY_WATCH_IDS", "").split(',') if steam_id.strip()]
+HISTORY_BUCKETS = {'none': None, 'day': 24 * 60 * 60, 'week': 7 * 24 * 60 * 60, 'month': 'month'}
+HISTORY_FIELDS = ('playtime_forever', 'playtime_windows_forever', 'playtime_mac_forever',
+                  'playtime_linux_forever', 'playtime_deck_forever')
+
+# Background warm-up configuration (off unless enabled); warm-up calls use at most WARMUP_API_SHARE of each Steam API budget
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "false").lower() == "true"
+WARMUP_API_SHARE = float(os.getenv("WARMUP_API_SHARE", 0.25))
+WARMUP_PLAN_INTERVAL = int(os.getenv("WARMUP_PLAN_INTERVAL", 60))  # seconds between scans for data to refresh
+WARMUP_RECENT_WINDOW = int(os.getenv("WARMUP_RECENT_WINDOW", 60 * 60))  # seconds a requested library stays warm
+WARMUP_TOP_APPS = int(os.getenv("WARMUP_TOP_APPS", 500))  # most-owned apps whose store details are kept fresh
+WARMUP_REFRESH_AT = 0.8  # fraction of a cache TTL after which an entry is refreshed ahead of expiry
+
+# Metrics exposed at /metrics
+metrics = Registry()
+http_request_seconds = metrics.histogram('http_request_duration_seconds', 'Time spent handling requests', ['endpoint', 'status'])
+request_phase_seconds = metrics.histogram('request_phase_duration_seconds', 'Time spent in each request phase', ['phase'])
+upstream_seconds = metrics.histogram('steam_upstream_duration_seconds', 'Steam API call latency, including urllib3 retries and backoff', ['endpoint'])
+upstream_requests = metrics.counter('steam_upstream_requests_total', 'Steam API calls by final HTTP status', ['endpoint', 'status'])
+upstream_retries = metrics.counter('steam_upstream_retries_total', 'Retries performed by the shared session', ['endpoint', 'reason'])
+upstream_bytes = metrics.counter('steam_upstream_bytes_total', 'Response bytes downloaded from Steam', ['endpoint'])
+cache_lookups = metrics.counter('cache_lookups_total', 'Cache lookups by cache and result', ['cache', 'result'])
+
+@contextmanager
+def timed_phase(name):
+    """Time a block (or, as a decorator, a function) as one phase of the current request.
+
+    Phases feed request_phase_seconds and the Server-Timing header. Time spent in a nested
+    phase (e.g. upstream inside library) counts only towards the inner one, so the
+    phases of a request never add up to more than its total.
+    """
+    stack = g.setdefault('phase_stack', []) if has_request_context() else None
+    nested = [0.0]  # seconds spent in phases opened inside this one
+    if stack is not None:
+        stack.append(nested)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if stack is not None:
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+        exclusive = elapsed - nested[0]
+        request_phase_seconds.observe(exclusive, phase=name)
+        if has_request_context() and 'phase_timings' in g:
+            g.phase_timings[name] = g.phase_timings.get(name, 0) + exclusive
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.phase_timings = {}
+
+@app.after_request
+def record_request_timing(response):
+    elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+    http_request_seconds.observe(elapsed, endpoint=request.endpoint or 'unknown', status=response.status_code)
+    timings = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in g.get('phase_timings', {}).items()]
+    response.headers['Server-Timing'] = ', '.join(timings + [f"total;dur={elapsed * 1000:.1f}"])
+    return response
+
 # User model
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -40,18 +217,141 @@ class User(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+# Cached GetOwnedGames payloads, keyed by SteamID64
+class LibraryCache(db.Model):
+    steam_id = db.Column(db.String(17), primary_key=True)
+    games_json = db.Column(db.Text, nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False)
+    fetched_at = db.Column(db.Float, nullable=False)
+    last_accessed = db.Column(db.Float, nullable=False, index=True)
+
+# Resolved custom URL names (lower-cased); steam_id is None for names that don't exist
+class VanityCache(db.Model):
+    vanity = db.Column(db.String(64), primary_key=True)
+    steam_id = db.Column(db.String(17), nullable=True)
+    resolved_at = db.Column(db.Float, nullable=False)
+
+# GetPlayerAchievements results per (SteamID, appid); status is the HTTP status served for the entry
+class AchievementCache(db.Model):
+    steam_id = db.Column(db.String(17), primary_key=True)
+    appid = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.Integer, nullable=False)
+    data_json = db.Column(db.Text, nullable=False)
+    fetched_at = db.Column(db.Float, nullable=False)
+
+# Parsed store appdetails shared by all users; success=False marks failed or delisted apps
+class AppDetails(db.Model):
+    appid = db.Column(db.Integer, primary_key=True)
+    details_json = db.Column(db.Text, nullable=False)
+    success = db.Column(db.Boolean, nullable=False)
+    fetched_at = db.Column(db.Float, nullable=False)
+
+    def is_stale(self, now):
+        ttl = APP_DETAILS_TTL if self.success else APP_DETAILS_NEGATIVE_TTL
+        return now - self.fetched_at >= ttl
+
+# SteamIDs whose playtime is snapshotted by the background sync
+class WatchedProfile(db.Model):
+    steam_id = db.Column(db.String(17), primary_key=True)
+    added_by = db.Column(db.String(80), nullable=True)
+    added_at = db.Column(db.Float, nullable=False)
+    first_synced_at = db.Column(db.Float, nullable=True)
+    last_synced_at = db.Column(db.Float, nullable=True, index=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+# The Steam profile each user has linked as their own; its library and name are kept warm
+class LinkedProfile(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    steam_id = db.Column(db.String(17), nullable=False, index=True)
+    linked_at = db.Column(db.Float, nullable=False)
+
+# Latest known playtime per watched (SteamID, appid), in minutes; deltas are computed against it
+class PlaytimeState(db.Model):
+    steam_id = db.Column(db.String(17), primary_key=True)
+    appid = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.Text, nullable=False)
+    playtime = db.Column(db.Integer, nullable=False)
+    playtime_windows = db.Column(db.Integer, nullable=False)
+    playtime_mac = db.Column(db.Integer, nullable=False)
+    playtime_linux = db.Column(db.Integer, nullable=False)
+    playtime_deck = db.Column(db.Integer, nullable=False)
+
+# Playtime gained per game between two syncs, attributed to the later sync's time
+class PlaytimeDelta(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    steam_id = db.Column(db.String(17), nullable=False)
+    appid = db.Column(db.Integer, nullable=False)
+    synced_at = db.Column(db.Float, nullable=False)
+    playtime = db.Column(db.Integer, nullable=False)
+    playtime_windows = db.Column(db.Integer, nullable=False)
+    playtime_mac = db.Column(db.Integer, nullable=False)
+    playtime_linux = db.Column(db.Integer, nullable=False)
+    playtime_deck = db.Column(db.Integer, nullable=False)
+    __table_args__ = (
+        db.Index('ix_playtime_delta_steam_time', 'steam_id', 'synced_at'),
+        db.Index('ix_playtime_delta_steam_app_time', 'steam_id', 'appid', 'synced_at'),
+    )
+
+PLAYTIME_COLUMNS = ('playtime', 'playtime_windows', 'playtime_mac', 'playtime_linux', 'playtime_deck')
+
+# Recently verified credentials, so repeat requests skip the SQL lookup and the slow password hash.
+# Entries are HMAC digests under a per-process random key; plaintext passwords are never stored.
+auth_cache_key = secrets.token_bytes(32)
+verified_credentials = OrderedDict()  # digest -> (username, verified_at), least recently used first
+verified_credentials_lock = threading.Lock()
+verified_credentials_generation = 0  # bumped on every User update or removal; verifications that started earlier aren't cached
+
+def credential_digest(username, password):
+    return hmac.new(auth_cache_key, f"{username}\0{password}".encode(), hashlib.sha256).digest()
+
+@db.event.listens_for(User, 'after_update')
+@db.event.listens_for(User, 'after_delete')
+def forget_verified_credentials(mapper, connection, target):
+    # A new password, rename or removal invalidates that user's cached verifications, under the old
+    # name too. New users have none, so registering can't flush anyone else's.
+    global verified_credentials_generation
+    usernames = {target.username, *db.inspect(target).attrs.username.history.deleted}
+    with verified_credentials_lock:
+        for digest in [digest for digest, (username, _) in verified_credentials.items() if username in usernames]:
+            del verified_credentials[digest]
+        verified_credentials_generation += 1
+
 @auth.verify_password
+@timed_phase('auth')
 def verify_password(username, password):
+    if not username or not password:
+        return None
+    digest = credential_digest(username, password)
+    now = time.time()
+    with verified_credentials_lock:
+        cached = verified_credentials.get(digest)
+        if cached and now - cached[1] < AUTH_CACHE_TTL:
+            verified_credentials.move_to_end(digest)
+            cache_lookups.inc(cache='auth', result='hit')
+            return cached[0]
+        generation = verified_credentials_generation
+
+    cache_lookups.inc(cache='auth', result='miss')
     user = User.query.filter_by(username=username).first()
     if user and user.check_password(password):
+        with verified_credentials_lock:
+            # A User change while the hash was being checked may have made this result stale
+            if generation == verified_credentials_generation:
+                verified_credentials[digest] = (username, now)
+                verified_credentials.move_to_end(digest)
+                while len(verified_credentials) > AUTH_CACHE_MAX_ENTRIES:
+                    verified_credentials.popitem(last=False)
         return username
     return None
 
-# Initialize rate-limiter
+# Initialize rate-limiter; RATELIMIT_ENABLED=false is meant for load tests only
+app.config['RATELIMIT_ENABLED'] = os.getenv("RATELIMIT_ENABLED", "true").lower() == "true"
 limiter = Limiter(
     get_remote_address,
     app=app,
-    default_limits=["200 per day", "50 per hour"]
+    default_limits=["200 per day", "50 per hour"],
+    # Set to e.g. sqlite:///ratelimits.db so several server processes share counters
+    storage_uri=os.getenv("RATELIMIT_STORAGE_URI", "memory://")
 )
 
 # Configure Talisman with CSP
@@ -62,189 +362,724 @@ csp = {
     'font-src': ["'self'", "https://fonts.gstatic.com"],
     'img-src': ["'self'", "http://media.steampowered.com"]
 }
-Talisman(app, content_security_policy=csp, force_https=True, strict_transport_security=True)
+# Set FORCE_HTTPS=false only when serving plain HTTP locally without a TLS-terminating proxy
+Talisman(app, content_security_policy=csp, force_https=os.getenv("FORCE_HTTPS", "true").lower() == "true", strict_transport_security=True)
+
+# Static assets: versions are content hashes and compressed copies are kept per file modification time
+asset_versions = {}
+compressed_assets = {}
+asset_lock = threading.Lock()
+
+def asset_version(filename):
+    """Return a short content hash for a file in the static folder, or None if it doesn't exist."""
+    path = safe_join(app.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    mtime = os.path.getmtime(path)
+    with asset_lock:
+        cached = asset_versions.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        version = hashlib.sha256(f.read()).hexdigest()[:12]
+    with asset_lock:
+        asset_versions[path] = (mtime, version)
+    return version
+
+def compress(data, encoding, static=False):
+    # Static files are compressed once, so they get the slowest, smallest settings
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if static else 5)
+    return gzip.compress(data, compresslevel=9 if static else 6, mtime=0)
+
+def compressed_asset(path, encoding):
+    mtime = os.path.getmtime(path)
+    key = (path, encoding)
+    with asset_lock:
+        cached = compressed_assets.get(key)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        data = compress(f.read(), encoding, static=True)
+    with asset_lock:
+        compressed_assets[key] = (mtime, data)
+    return data
+
+def preferred_encoding():
+    accepted = request.accept_encodings
+    if brotli and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code != 200 or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = preferred_encoding()
+    if encoding is None:
+        return response
+    if request.endpoint == 'static':
+        path = safe_join(app.static_folder, request.view_args['filename'])
+        if os.path.getsize(path) < COMPRESS_MIN_BYTES:
+            return response
+        data = compressed_asset(path, encoding)
+        if hasattr(response.response, 'close'):
+            response.response.close()
+        response.direct_passthrough = False
+    elif response.is_streamed or response.content_length < COMPRESS_MIN_BYTES:
+        return response
+    else:
+        data = compress(response.get_data(), encoding)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    # The compressed body is no longer byte-identical to what the validator was computed for
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+@app.after_request
+def cache_static_assets(response):
+    # Only the current content hash may be cached for good; stale ?v= URLs keep revalidating
+    if (request.endpoint == 'static' and response.status_code in (200, 304)
+            and request.args.get('v') and request.args.get('v') == asset_version(request.view_args['filename'])):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+def upstream_endpoint(url):
+    """Short metric label for a Steam URL, e.g. GetOwnedGames or appdetails."""
+    path = urlsplit(url).path.strip('/').split('/')
+    if path[:2] == ['api', 'appdetails']:
+        return 'appdetails'
+    return path[1] if len(path) > 1 else path[0] or 'unknown'
+
+class CountingRetry(Retry):
+    """Retry policy that records every retry urllib3 performs."""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        reason = response.status if response is not None else type(error).__name__
+        upstream_retries.inc(endpoint=upstream_endpoint(url or ''), reason=reason)
+        return super().increment(method, url, response, error, _pool, _stacktrace)
 
 # Configure requests session
 session = requests.Session()
-retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
+retries = CountingRetry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
 session.mount('http://', HTTPAdapter(max_retries=retries))
 session.mount('https://', HTTPAdapter(max_retries=retries))
+# The store and achievements APIs are rate-limited by their fetchers, so 429s must reach them instead of being retried here.
+# Adapters are mounted per endpoint path, since the two bases can be the same host (e.g. benchmarks/fake_steam.py)
+store_retries = CountingRetry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
+session.mount(f'{STEAM_STORE_BASE}/api/appdetails', HTTPAdapter(max_retries=store_retries, pool_maxsize=DETAILS_FETCH_WORKERS))
+session.mount(f'{STEAM_API_BASE}/ISteamUserStats/', HTTPAdapter(max_retries=store_retries, pool_maxsize=ACHIEVEMENT_FETCH_WORKERS))
 session.headers.update({
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
     'Accept': 'application/json',
     'Accept-Language': 'en-US,en;q=0.9'
 })
 
+# Concurrent identical upstream GETs (e.g. several tabs opening the same shared link) share one call
+upstream_calls = SingleFlight()
+
+def steam_get(url, timeout):
+    endpoint = upstream_endpoint(url)
+
+    def call():
+        start = time.perf_counter()
+        try:
+            response = session.get(url, timeout=timeout)
+        except requests.exceptions.RequestException:
+            upstream_requests.inc(endpoint=endpoint, status='error')
+            raise
+        finally:
+            upstream_seconds.observe(time.perf_counter() - start, endpoint=endpoint)
+        upstream_requests.inc(endpoint=endpoint, status=response.status_code)
+        upstream_bytes.inc(len(response.content), endpoint=endpoint)
+        return response
+
+    with timed_phase('upstream'):
+        return upstream_calls.do(url, call)
+
 def fetch_game_details(appid):
+    """Fetch and parse store appdetails for one app; returns None if the store reports no details for it.
+
+    Raises RateLimited when the store answers 429 so the fetch engine can back off, and
+    requests.RequestException on transport errors and other non-2xx responses.
+    """
     if not isinstance(appid, (int, str)) or not str(appid).isdigit():
         print(f"Invalid appid: {appid}")
+        return None
+    url = f"{STEAM_STORE_BASE}/api/appdetails?appids={appid}"
+    response = steam_get(url, timeout=5)
+    if response.status_code == 429:
+        retry_after = response.headers.get('Retry-After', '')
+        raise RateLimited(float(retry_after) if retry_after.isdigit() else None)
+    response.raise_for_status()
+    data = response.json()
+    if data and str(appid) in data and data[str(appid)]['success']:
+        details = data[str(appid)]['data']
+        return {
+            'genres': [genre['description'] for genre in details.get('genres', [])],
+            'release_date': details.get('release_date', {}).get('date', 'Unknown'),
+            'categories': [category['description'] for category in details.get('categories', [])]
+        }
+    return None
+
+def store_game_details(appid, details):
+    """Save fetched details (or a negative entry when details is None) to the AppDetails table."""
+    entry = db.session.get(AppDetails, int(appid)) or AppDetails(appid=int(appid))
+    entry.details_json = json.dumps(details or {})
+    entry.success = details is not None
+    entry.fetched_at = time.time()
+    db.session.add(entry)
+    db.session.commit()
+    if details:
+        with library_search_lock:
+            if library_search_loaded.is_set():
+                library_search.set_metadata(int(appid), details['genres'] + details['categories'])
+
+def fetch_and_store_game_details(appid):
+    """Fetch and store one app's details; returns None without storing anything on transport errors."""
+    with app.app_context():
+        try:
+            details = fetch_game_details(appid)
+        except requests.exceptions.RequestException as e:
+            # Not cached, so an outage doesn't hide the app's details for APP_DETAILS_NEGATIVE_TTL
+            print(f"HTTP error fetching details for appid {appid}: {e}")
+            return None
+        store_game_details(appid, details)
+        return details or {}
+
+# Shared engine for all appdetails traffic: bounded workers behind one store API token bucket
+store_api_bucket = TokenBucket(STORE_API_RATE / SERVER_PROCESSES, max(1, STORE_API_BURST // SERVER_PROCESSES))
+details_fetcher = ConcurrentFetcher(fetch_and_store_game_details, store_api_bucket, DETAILS_FETCH_WORKERS, name='details-fetch')
+# Stale entries are refreshed on their own small pool, which only takes a token once no user fetch is queued
+details_refresher = ConcurrentFetcher(fetch_and_store_game_details, store_api_bucket, DETAILS_REFRESH_WORKERS,
+                                      name='details-refresh', yield_to=details_fetcher, max_pending=DETAILS_REFRESH_MAX_PENDING)
+
+def get_stored_game_details(appids):
+    """Return {appid: details} for apps already in the AppDetails store, without calling upstream."""
+    appids = [int(appid) for appid in appids]
+    if not appids:
         return {}
-    url = f"https://store.steampowered.com/api/appdetails?appids={appid}"
+    return {entry.appid: json.loads(entry.details_json) for entry in AppDetails.query.filter(AppDetails.appid.in_(appids)).all()}
+
+@timed_phase('details')
+def get_game_details(appids, timeout=DETAILS_FETCH_TIMEOUT):
+    """Return ({appid: details}, pending_appids) from the AppDetails store.
+
+    Apps never seen before are fetched concurrently for up to timeout seconds; any still
+    in flight after that are returned in pending_appids and stored once they complete.
+    Apps whose fetch failed are listed in pending_appids too and fetched again next time.
+    Stale entries are served as-is and queued for a background refresh that never
+    delays the fetches of missing apps.
+    """
+    appids = [int(appid) for appid in appids]
+    now = time.time()
+    entries = {entry.appid: entry for entry in AppDetails.query.filter(AppDetails.appid.in_(appids)).all()} if appids else {}
+    result = {}
+    missing = []
+    stale = []
+    for appid in appids:
+        entry = entries.get(appid)
+        if entry is None:
+            missing.append(appid)
+            continue
+        if entry.is_stale(now):
+            stale.append(appid)
+        result[appid] = json.loads(entry.details_json)
+    cache_lookups.inc(len(result), cache='app_details', result='hit')
+    cache_lookups.inc(len(missing), cache='app_details', result='miss')
+    # Queue the missing apps first so the refreshes see them and wait
+    for appid in missing:
+        details_fetcher.submit(appid)
+    for appid in stale:
+        details_refresher.submit(appid)
+    for appid, details in details_fetcher.imap_unordered(missing, timeout=timeout):
+        if details is not None:
+            result[appid] = details
+    pending = [appid for appid in missing if appid not in result]
+    return result, pending
+
+@timed_phase('resolve')
+def resolve_vanity_name(username, force_refresh=False):
+    """Return (steam_id, error) for a Steam custom URL name, using VanityCache when possible.
+
+    Names that fail to resolve are cached for VANITY_NEGATIVE_TTL; transport errors are not cached.
+    """
+    key = username.lower()
+    now = time.time()
+    entry = db.session.get(VanityCache, key)
+    if entry and not force_refresh:
+        ttl = VANITY_CACHE_TTL if entry.steam_id else VANITY_NEGATIVE_TTL
+        if now - entry.resolved_at < ttl:
+            cache_lookups.inc(cache='vanity', result='hit')
+            if entry.steam_id is None:
+                print(f"Failed to resolve username (cached): {username}")
+                return None, ("Invalid username or profile not found", 404)
+            return entry.steam_id, None
+
+    cache_lookups.inc(cache='vanity', result='miss')
+    resolve_url = f"{STEAM_API_BASE}/ISteamUser/ResolveVanityURL/v0001/?key={API_KEY}&vanityurl={username}"
     try:
-        response = session.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        if str(appid) in data and data[str(appid)]['success']:
-            details = data[str(appid)]['data']
-            return {
-                'genres': [genre['description'] for genre in details.get('genres', [])],
-                'release_date': details.get('release_date', {}).get('date', 'Unknown'),
-                'categories': [category['description'] for category in details.get('categories', [])]
-            }
-        return {}
+        resolve_response = steam_get(resolve_url, timeout=5)
+        resolve_response.raise_for_status()
+        resolve_data = resolve_response.json()
     except requests.exceptions.RequestException as e:
-        print(f"HTTP error fetching details for appid {appid}: {e}")
-        return {}
-    finally:
-        time.sleep(0.1)
+        print(f"Request error resolving username {username}: {str(e)}")
+        return None, (f"Failed to resolve username: {str(e)}", 500)
+
+    steam_id = resolve_data["response"]["steamid"] if resolve_data["response"]["success"] == 1 else None
+    if entry is None:
+        entry = VanityCache(vanity=key)
+        db.session.add(entry)
+    entry.steam_id = steam_id
+    entry.resolved_at = now
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+    if steam_id is None:
+        print(f"Failed to resolve username: {username}")
+        return None, ("Invalid username or profile not found", 404)
+    return steam_id, None
+
+def resolve_steam_id(value):
+    """Return (steam_id, error) for either a SteamID64 or a custom URL name."""
+    if value.isdigit() and len(value) == 17:
+        return value, None
+    return resolve_vanity_name(value)
+
+def evict_library_cache():
+    """Drop least-recently-used cached libraries until the cache fits its size budget."""
+    total = db.session.query(db.func.coalesce(db.func.sum(LibraryCache.size_bytes), 0)).scalar()
+    if total <= LIBRARY_CACHE_MAX_BYTES:
+        return
+    # Only the keys and sizes are read; loading the rows would pull in every games_json
+    evicted = []
+    for steam_id, size_bytes in db.session.query(LibraryCache.steam_id, LibraryCache.size_bytes).order_by(
+            LibraryCache.last_accessed.asc()):
+        if total <= LIBRARY_CACHE_MAX_BYTES:
+            break
+        total -= size_bytes
+        evicted.append(steam_id)
+    db.session.execute(db.delete(LibraryCache).where(LibraryCache.steam_id.in_(evicted)))
+    db.session.commit()
+    for steam_id in evicted:
+        print(f"Evicting cached library for SteamID {steam_id}")
+        library_search.remove_library(steam_id)
+
+# Name search across every cached library; loaded from the database on the first /search and
+# then kept current as libraries are fetched and evicted
+library_search = LibrarySearch()
+library_search_loaded = threading.Event()
+library_search_lock = threading.Lock()
+
+def load_library_search():
+    with library_search_lock:
+        if library_search_loaded.is_set():
+            return
+        start = time.perf_counter()
+        for steam_id, games_json in db.session.query(LibraryCache.steam_id, LibraryCache.games_json):
+            library_search.update_library(steam_id, json.loads(games_json))
+        for appid, details_json in db.session.query(AppDetails.appid, AppDetails.details_json).filter_by(success=True):
+            details = json.loads(details_json)
+            library_search.set_metadata(appid, details.get('genres', []) + details.get('categories', []))
+        library_search_loaded.set()
+        print(f"Loaded search index: {library_search.stats()} in {time.perf_counter() - start:.2f}s")
+
+def library_name_search(steam_id):
+    """Return a LibraryIndex name_search answered by library_search, restricted to steam_id's library."""
+    def name_search(search, ranked):
+        load_library_search()
+        return library_search.library_matches(steam_id, search, ranked)
+    return name_search
+
+# Parsed LibraryIndex per SteamID, least recently used first
+library_indexes = OrderedDict()
+library_indexes_lock = threading.Lock()
+
+def cached_library_index(steam_id, fetched_at):
+    with library_indexes_lock:
+        index = library_indexes.get(steam_id)
+        if index is None or index.fetched_at != fetched_at:
+            return None
+        library_indexes.move_to_end(steam_id)
+        return index
+
+def remember_library_index(steam_id, index):
+    with library_indexes_lock:
+        library_indexes[steam_id] = index
+        library_indexes.move_to_end(steam_id)
+        while len(library_indexes) > LIBRARY_INDEX_CACHE_SIZE:
+            library_indexes.popitem(last=False)
+
+# Filtered and sorted views that paging cursors point into
+library_snapshots = ViewSnapshots(LIBRARY_SNAPSHOT_TTL, LIBRARY_SNAPSHOT_MAX_BYTES)
+
+@timed_phase('library')
+def get_library_index(steam_id, force_refresh=False, touch=False):
+    """Return (LibraryIndex, error) for a SteamID64, serving from LibraryCache while it is fresh.
+
+    The parsed index is kept in memory per SteamID, so repeat requests skip JSON decoding.
+    User requests pass touch=True to count as an access for eviction; cache hits only write
+    last_accessed once it is LIBRARY_ACCESS_RESOLUTION seconds old, so most reads stay read-only.
+    error is a (message, status_code) tuple when the library could not be loaded.
+    """
+    now = time.time()
+    entry = db.session.get(LibraryCache, steam_id, options=[defer(LibraryCache.games_json)])
+    if entry and not force_refresh and now - entry.fetched_at < LIBRARY_CACHE_TTL:
+        fetched_at = entry.fetched_at
+        cache_lookups.inc(cache='library', result='hit')
+        index = cached_library_index(steam_id, fetched_at)
+        cache_lookups.inc(cache='library_index', result='hit' if index else 'miss')
+        if index is None:
+            index = LibraryIndex(json.loads(entry.games_json), fetched_at, library_name_search(steam_id))
+            remember_library_index(steam_id, index)
+        if touch and now - entry.last_accessed >= LIBRARY_ACCESS_RESOLUTION:
+            entry.last_accessed = now
+            db.session.commit()
+        return index, None
+
+    cache_lookups.inc(cache='library', result='miss')
+    library_url = f"{STEAM_API_BASE}/IPlayerService/GetOwnedGames/v0001/?key={API_KEY}&steamid={steam_id}&format=json&include_appinfo=true"
+    try:
+        library_response = steam_get(library_url, timeout=10)
+        if library_response.status_code == 400:
+            print("Steam API returned 400 - Invalid SteamID64 or profile does not exist")
+            return None, ("Invalid SteamID64 or profile does not exist.", 400)
+        if library_response.status_code == 403:
+            print("Steam API returned 403 - Profile is private")
+            return None, ("Profile is private. Please set your game details to public in Steam (Settings > Privacy).", 403)
+        if library_response.status_code == 429:
+            print("Steam API returned 429 - Rate limit exceeded")
+            return None, ("Rate limit exceeded. Please try again later.", 429)
+        library_response.raise_for_status()
+        library_data = library_response.json()
+    except requests.exceptions.RequestException as e:
+        print(f"Request error for SteamID {steam_id}: {str(e)}")
+        return None, (f"Failed to fetch data from Steam API: {str(e)}", 500)
+
+    if "response" not in library_data or "games" not in library_data["response"]:
+        print(f"No games found for SteamID {steam_id} or profile is private")
+        return None, ("No games found or profile is private", 404)
+
+    games = library_data["response"]["games"]
+    games_json = json.dumps(games)
+    if entry is None:
+        entry = LibraryCache(steam_id=steam_id)
+        db.session.add(entry)
+    entry.games_json = games_json
+    entry.size_bytes = len(games_json)
+    entry.fetched_at = now
+    if touch or entry.last_accessed is None:
+        entry.last_accessed = now
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request for the same SteamID stored the library first
+        db.session.rollback()
+    with library_search_lock:
+        if library_search_loaded.is_set():
+            library_search.update_library(steam_id, games)
+    evict_library_cache()
+    index = LibraryIndex(games, now, library_name_search(steam_id))
+    remember_library_index(steam_id, index)
+    return index, None
+
+# Serialises snapshots within this process; across processes, sync_watched_profiles claims each
+# profile in the database before fetching it, so only one process records a given snapshot
+history_lock = threading.Lock()
+
+def record_playtime(steam_id, games, now):
+    """Store each game's playtime change since the last snapshot and update the stored totals.
+
+    The first snapshot of a profile only records the baseline, so lifetime playtime isn't
+    reported as activity at that moment; games added later count from zero. Rows are
+    written in bulk, since a library can hold tens of thousands of games.
+    """
+    with history_lock:
+        profile = db.session.get(WatchedProfile, steam_id)
+        if profile is None:
+            print(f"SteamID {steam_id} was unwatched during its sync; snapshot discarded")
+            return
+        state = {row[0]: list(row[1:]) for row in db.session.query(
+            PlaytimeState.appid, *(getattr(PlaytimeState, column) for column in PLAYTIME_COLUMNS)
+        ).filter_by(steam_id=steam_id)}
+        baseline = profile.first_synced_at is None
+        added, updated, deltas = [], [], []
+        for game in games:
+            values = [game.get(field, 0) or 0 for field in HISTORY_FIELDS]
+            row = dict(zip(PLAYTIME_COLUMNS, values), steam_id=steam_id, appid=game['appid'], name=game['name'])
+            previous = state.get(game['appid'])
+            if previous is None:
+                added.append(row)
+                previous = [0] * len(PLAYTIME_COLUMNS)
+            elif values != previous:
+                updated.append(row)
+            if values != previous and not baseline:
+                deltas.append(dict({column: value - old for column, value, old in zip(PLAYTIME_COLUMNS, values, previous)},
+                                   steam_id=steam_id, appid=game['appid'], synced_at=now))
+        if added:
+            db.session.execute(db.insert(PlaytimeState), added)
+        if updated:
+            db.session.execute(db.update(PlaytimeState), updated)
+        if deltas:
+            db.session.execute(db.insert(PlaytimeDelta), deltas)
+        profile.first_synced_at = profile.first_synced_at or now
+        profile.last_synced_at = now
+        profile.last_error = None
+        db.session.commit()
+    print(f"Recorded playtime snapshot for SteamID {steam_id}: {len(deltas)} games changed")
+
+def parse_library_query(args):
+    """Validate the filter, sort and pagination arguments shared by the library endpoints.
+
+    Returns (query, error) where query is a dict of parsed values.
+    """
+    try:
+        page = int(args.get('page', 1))
+        per_page = int(args.get('per_page', 50))
+    except ValueError:
+        print("Invalid pagination parameters")
+        return None, ("Invalid pagination parameters", 400)
+    export_all = args.get('exportAll', 'false').lower() == 'true'
+    sort_by = args.get('sortBy', 'name')
+    date_range = args.get('dateRange', 'all')
+
+    max_per_page = 10000 if per_page > 1000 else 500
+    if not export_all and (page < 1 or per_page < 1 or per_page > max_per_page):
+        print(f"Invalid pagination parameters: page={page}, per_page={per_page}, max_per_page={max_per_page}")
+        return None, ("Invalid pagination parameters", 400)
+    if sort_by not in SORT_OPTIONS:
+        print("Invalid sort_by parameter")
+        return None, ("Invalid sort_by parameter", 400)
+    if date_range not in DATE_RANGES:
+        print("Invalid date_range parameter")
+        return None, ("Invalid date_range parameter", 400)
+
+    return {
+        'page': page,
+        'per_page': per_page,
+        'export_all': export_all,
+        'flags': flags_from_args(args),
+        'search': args.get('search', '').strip().lower(),
+        'date_range': date_range,
+        'sort_by': sort_by,
+        'fetch_details': args.get('fetchDetails', 'false').lower() == 'true',
+        'force_refresh': args.get('refresh', 'false').lower() == 'true',
+        'cursor': args.get('cursor', ''),
+    }, None
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response if the client's cached copy matches etag / last_modified, else None."""
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    else:
+        fresh = (last_modified is not None and request.if_modified_since is not None
+                 and last_modified.replace(microsecond=0) <= request.if_modified_since)
+    if not fresh:
+        return None
+    response = Response(status=304)
+    set_validators(response, etag, last_modified)
+    return response
+
+def set_validators(response, etag, last_modified=None):
+    # private: responses depend on the logged-in user; no-cache: always revalidate, which costs a 304
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def stored_library_index(steam_id, fetched_at):
+    """Return the LibraryIndex for steam_id if LibraryCache still holds the version fetched at fetched_at."""
+    index = cached_library_index(steam_id, fetched_at)
+    if index is None:
+        entry = db.session.get(LibraryCache, steam_id)
+        if entry is None or entry.fetched_at != fetched_at:
+            return None
+        index = LibraryIndex(json.loads(entry.games_json), fetched_at, library_name_search(steam_id))
+        remember_library_index(steam_id, index)
+    return index
+
+def resolve_cursor(steam_id, cursor):
+    """Return (snapshot, offset, error) for a cursor issued by library_page_response.
+
+    Snapshots live in one process's memory. When the cursor's snapshot isn't here (it was
+    evicted, or another server process issued it), it is rebuilt from the view recorded in
+    the cursor, as long as the stored library is still the version the cursor was taken from.
+    """
+    decoded = decode_cursor(cursor)
+    if decoded is None:
+        return None, None, ("Invalid cursor", 400)
+    snapshot_id, offset, view = decoded
+    user = auth.current_user()
+    snapshot = library_snapshots.get(snapshot_id)
+    if snapshot is None:
+        if len(view) != 6:
+            return None, None, ("Invalid cursor", 400)
+        fetched_at, flags, search, date_range, sort_by, taken_at = view
+        if not (isinstance(fetched_at, (int, float)) and isinstance(flags, int) and isinstance(search, str)
+                and isinstance(date_range, str) and date_range in DATE_RANGES
+                and isinstance(sort_by, str) and sort_by in SORT_OPTIONS and isinstance(taken_at, (int, float))):
+            return None, None, ("Invalid cursor", 400)
+        index = stored_library_index(steam_id, fetched_at)
+        if index is None:
+            return None, None, ("Cursor expired; reload the first page", 410)
+        with timed_phase('query'):
+            positions = index.query(flags, search, date_range, sort_by, now=taken_at)
+        snapshot = library_snapshots.snapshot((user, steam_id, fetched_at, flags, search, date_range, sort_by),
+                                              index, positions, taken_at=taken_at)
+    if snapshot.key[:2] != (user, steam_id) or offset > len(snapshot.positions):
+        return None, None, ("Invalid cursor", 400)
+    return snapshot, offset, None
+
+def cursor_view(snapshot):
+    # (fetched_at, flags, search, date_range, sort_by) from the snapshot key, plus when it was taken
+    return list(snapshot.key[2:]) + [snapshot.taken_at]
+
+def library_page_response(steam_id, query):
+    """Load, filter, sort and paginate a library and return the JSON response for it.
+
+    A multi-page result is snapshotted, and next_cursor/prev_cursor page through that
+    snapshot; with a cursor the filter and sort arguments are ignored in favour of it.
+    """
+    per_page = query['per_page']
+    snapshot = None
+    if query['cursor']:
+        snapshot, start, error = resolve_cursor(steam_id, query['cursor'])
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        index, filtered = snapshot.index, snapshot.positions
+    else:
+        index, error = get_library_index(steam_id, query['force_refresh'], touch=True)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        taken_at = time.time()
+        with timed_phase('query'):
+            filtered = index.query(query['flags'], query['search'], query['date_range'], query['sort_by'], now=taken_at)
+        start = (query['page'] - 1) * per_page
+
+    # Handle exportAll: return all games without pagination
+    if query['export_all']:
+        total_games = len(filtered)
+        start, end = 0, total_games
+        page = 1
+        per_page = total_games
+        total_pages = 1
+    else:
+        page = start // per_page + 1
+        if snapshot is None and len(filtered) > per_page:
+            view = (auth.current_user(), steam_id, index.fetched_at, query['flags'], query['search'],
+                    query['date_range'], query['sort_by'])
+            # A live snapshot of the same view may be reused, and for date ranges its positions
+            # can differ from this query's, so the totals below are taken from the snapshot
+            snapshot = library_snapshots.snapshot(view, index, filtered, taken_at=taken_at)
+            filtered = snapshot.positions
+        total_games = len(filtered)
+        total_pages = (total_games + per_page - 1) // per_page if total_games > 0 else 1
+        # A page past the end is empty; clamping keeps its prev_cursor inside the snapshot
+        start = min(start, total_games)
+        end = start + per_page
+
+    # The page is fully determined by the library version and the positions it selected,
+    # so a matching ETag is answered before any game is copied, enriched or serialised.
+    # The snapshot id is included so cached pages never hold cursors that have expired.
+    etag = hashlib.sha1(
+        f"{steam_id}:{index.fetched_at!r}:{total_games}:{start}:{per_page}:{query['fetch_details']}:"
+        f"{snapshot.id if snapshot else ''}:".encode()
+        + array('l', filtered[start:end]).tobytes()
+    ).hexdigest()
+    # Date-range results move with the clock, so only the ETag can validate them
+    last_modified = None
+    if query['date_range'] == 'all' and not query['cursor'] and index.fetched_at is not None:
+        last_modified = datetime.fromtimestamp(index.fetched_at, timezone.utc)
+    cached = not_modified(etag, last_modified)
+    if cached is not None:
+        return cached
+    paginated_games = index.page(filtered, start, end)
+
+    details_pending = []
+    if query['fetch_details']:
+        details, details_pending = get_game_details([game['appid'] for game in paginated_games])
+        for game in paginated_games:
+            game['details'] = details.get(game['appid'], {})
+    else:
+        for game in paginated_games:
+            game['details'] = {}
+
+    response = {
+        "steam_id": steam_id,
+        "games": paginated_games,
+        "total_games": total_games,
+        "page": page,
+        "per_page": per_page,
+        "total_pages": total_pages,
+        "next_cursor": encode_cursor(snapshot.id, end, cursor_view(snapshot)) if snapshot and end < total_games else None,
+        "prev_cursor": encode_cursor(snapshot.id, max(start - per_page, 0), cursor_view(snapshot)) if snapshot and start > 0 else None,
+        "details_pending": details_pending
+    }
+    print(f"Successfully fetched {len(paginated_games)} games for SteamID {steam_id} (page {page}, total filtered: {total_games})")
+    response = jsonify(response)
+    # Pages still waiting on details will change, so they aren't given validators
+    if not details_pending:
+        set_validators(response, etag, last_modified)
+    return response
+
+ASSET_REFERENCE = re.compile(r'(?P<attr>src|href)="/(?P<path>[^"?#:]+\.(?:js|css))"')
+
+def versioned_asset_reference(match):
+    version = asset_version(match['path'])
+    if version is None:
+        return match[0]
+    return f'{match["attr"]}="/{match["path"]}?v={version}"'
 
 @app.route('/')
 @auth.login_required
 @limiter.limit("10 per minute")
 def serve_index():
-    return send_from_directory(app.static_folder, 'index.html')
+    # Point script and stylesheet URLs at their current content hash so they can be cached for good
+    with open(os.path.join(app.static_folder, 'index.html'), encoding='utf-8') as f:
+        html = ASSET_REFERENCE.sub(versioned_asset_reference, f.read())
+    response = Response(html, mimetype='text/html')
+    response.set_etag(hashlib.sha1(html.encode()).hexdigest())
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/get_library', methods=['GET'])
 @auth.login_required
 @limiter.limit("10 per minute")
 def get_library():
     username = request.args.get('username')
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 50))
-    export_all = request.args.get('exportAll', 'false').lower() == 'true'
-    show_played_only = request.args.get('showPlayedOnly', 'false').lower() == 'true'
-    filter_windows = request.args.get('filterWindows', 'false').lower() == 'true'
-    filter_mac = request.args.get('filterMac', 'false').lower() == 'true'
-    filter_linux = request.args.get('filterLinux', 'false').lower() == 'true'
-    filter_deck = request.args.get('filterDeck', 'false').lower() == 'true'
-    search_query = request.args.get('search', '').strip().lower()
-    date_range = request.args.get('dateRange', 'all')
-    sort_by = request.args.get('sortBy', 'name')
-    fetch_details = request.args.get('fetchDetails', 'false').lower() == 'true'
 
     if not username:
         print("No username provided")
         return jsonify({"error": "No username provided"}), 400
 
-    # ... (existing validation code remains unchanged) ...
+    query, error = parse_library_query(request.args)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
 
     # Resolve username to SteamID
-    resolve_url = f"http://api.steampowered.com/ISteamUser/ResolveVanityURL/v0001/?key={API_KEY}&vanityurl={username}"
-    try:
-        resolve_response = session.get(resolve_url, timeout=5)
-        resolve_response.raise_for_status()
-        resolve_data = resolve_response.json()
-        if resolve_data["response"]["success"] != 1:
-            print(f"Failed to resolve username: {username}")
-            return jsonify({"error": "Invalid username or profile not found"}), 404
-        steam_id = resolve_data["response"]["steamid"]
-    except requests.exceptions.RequestException as e:
-        print(f"Request error resolving username {username}: {str(e)}")
-        return jsonify({"error": f"Failed to resolve username: {str(e)}"}), 500
+    steam_id, error = resolve_vanity_name(username)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
 
-    library_url = f"http://api.steampowered.com/IPlayerService/GetOwnedGames/v0001/?key={API_KEY}&steamid={steam_id}&format=json&include_appinfo=true"
-    try:
-        library_response = session.get(library_url, timeout=5)
-        if library_response.status_code == 400:
-            return jsonify({"error": "Invalid SteamID64 or profile does not exist."}), 400
-        if library_response.status_code == 403:
-            return jsonify({"error": "Profile is private. Please set your game details to public in Steam (Settings > Privacy)."}), 403
-        library_response.raise_for_status()
-        library_data = library_response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Request error for SteamID {steam_id}: {str(e)}")
-        return jsonify({"error": f"Failed to fetch data from Steam API: {str(e)}"}), 500
-
-    if "response" in library_data and "games" in library_data["response"]:
-        games = library_data["response"]["games"]
-        filtered_games = [game for game in games if isinstance(game, dict) and 'appid' in game and 'name' in game]
-
-        # Apply filters
-        if show_played_only:
-            filtered_games = [game for game in filtered_games if game.get('playtime_forever', 0) > 0]
-        if filter_windows:
-            filtered_games = [game for game in filtered_games if game.get('playtime_windows_forever', 0) > 0]
-        if filter_mac:
-            filtered_games = [game for game in filtered_games if game.get('playtime_mac_forever', 0) > 0]
-        if filter_linux:
-            filtered_games = [game for game in filtered_games if game.get('playtime_linux_forever', 0) > 0]
-        if filter_deck:
-            filtered_games = [game for game in filtered_games if game.get('playtime_deck_forever', 0) > 0]
-        if search_query:
-            filtered_games = [game for game in filtered_games if search_query in game.get('name', '').lower()]
-        if date_range != 'all':
-            now = int(time.time())
-            cutoff = now - (30 * 24 * 60 * 60) if date_range == 'last30Days' else now - (365 * 24 * 60 * 60)
-            filtered_games = [game for game in filtered_games if 'rtime_last_played' in game and game['rtime_last_played'] and game['rtime_last_played'] >= cutoff]
-
-        # Apply sorting
-        if sort_by == 'name':
-            filtered_games = sorted(filtered_games, key=lambda x: x.get('name', '').lower())
-        elif sort_by == 'playtime':
-            filtered_games = sorted(filtered_games, key=lambda x: x.get('playtime_forever', 0), reverse=True)
-        elif sort_by == 'lastPlayed':
-            filtered_games = sorted(filtered_games, key=lambda x: x.get('rtime_last_played', 0), reverse=True)
-        elif sort_by == 'playtime2Weeks':
-            filtered_games = sorted(filtered_games, key=lambda x: x.get('playtime_2weeks', 0), reverse=True)
-
-        total_games = len(filtered_games)
-
-        # Handle exportAll: return all games without pagination
-        if export_all:
-            paginated_games = filtered_games  # Use the full filtered list
-            page = 1
-            per_page = total_games  # Set per_page to total to reflect all games
-            total_pages = 1  # Single page for the full export
-        else:
-            # Normal pagination
-            max_per_page = 10000 if per_page > 1000 else 500
-            if page < 1 or per_page < 1 or per_page > max_per_page:
-                print(f"Invalid pagination parameters: page={page}, per_page={per_page}, max_per_page={max_per_page}")
-                return jsonify({"error": "Invalid pagination parameters"}), 400
-            if per_page <= 0:
-                per_page = 50
-            start = max(0, (page - 1) * per_page)
-            end = min(start + per_page, total_games)
-            paginated_games = filtered_games[start:end]
-            total_pages = (total_games + per_page - 1) // per_page if total_games > 0 else 1
-
-        if fetch_details:
-            for game in paginated_games:
-                game['details'] = fetch_game_details(game['appid'])
-        else:
-            for game in paginated_games:
-                game['details'] = {}
-
-        response = {
-            "steam_id": steam_id,
-            "games": paginated_games,
-            "total_games": total_games,
-            "page": page,
-            "per_page": per_page,
-            "total_pages": total_pages
-        }
-        print(f"Successfully fetched {len(paginated_games)} games for SteamID {steam_id} (page {page}, total filtered: {total_games})")
-        return jsonify(response)
-    else:
-        print(f"No games found for SteamID {steam_id} or profile is private")
-        return jsonify({"error": "No games found or profile is private"}), 404
+    return library_page_response(steam_id, query)
 
 @app.route('/get_library_by_id', methods=['GET'])
 @auth.login_required
 @limiter.limit("5 per minute")
 def get_library_by_id():
     steam_id = request.args.get('steamid')
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 50))
-    show_played_only = request.args.get('showPlayedOnly', 'false').lower() == 'true'
-    filter_windows = request.args.get('filterWindows', 'false').lower() == 'true'
-    filter_mac = request.args.get('filterMac', 'false').lower() == 'true'
-    filter_linux = request.args.get('filterLinux', 'false').lower() == 'true'
-    filter_deck = request.args.get('filterDeck', 'false').lower() == 'true'
-    search_query = request.args.get('search', '').strip().lower()
-    date_range = request.args.get('dateRange', 'all')
-    sort_by = request.args.get('sortBy', 'name')
-    fetch_details = request.args.get('fetchDetails', 'false').lower() == 'true'
 
     if not steam_id:
         print("No SteamID64 provided")
@@ -253,99 +1088,454 @@ def get_library_by_id():
         print("Invalid SteamID64 format")
         return jsonify({"error": "Invalid SteamID64 format"}), 400
 
-    max_per_page = 10000 if per_page > 1000 else 500
-    if page < 1 or per_page < 1 or per_page > max_per_page:
-        print(f"Invalid pagination parameters: page={page}, per_page={per_page}, max_per_page={max_per_page}")
+    query, error = parse_library_query(request.args)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+
+    print(f"Fetching library for SteamID64: {steam_id}")
+    return library_page_response(steam_id, query)
+
+@app.route('/library_stats', methods=['GET'])
+@auth.login_required
+@limiter.limit("10 per minute")
+def library_stats():
+    steam_id = request.args.get('steamid')
+    username = request.args.get('username')
+    try:
+        top_n = int(request.args.get('top', 20))
+    except ValueError:
+        return jsonify({"error": "Invalid top parameter"}), 400
+    if not 1 <= top_n <= LIBRARY_STATS_MAX_TOP:
+        return jsonify({"error": f"top must be between 1 and {LIBRARY_STATS_MAX_TOP}"}), 400
+
+    if steam_id:
+        if not steam_id.isdigit() or len(steam_id) != 17:
+            print("Invalid SteamID64 format")
+            return jsonify({"error": "Invalid SteamID64 format"}), 400
+    elif username:
+        steam_id, error = resolve_vanity_name(username)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+    else:
+        print("No username or SteamID64 provided")
+        return jsonify({"error": "No username or SteamID64 provided"}), 400
+
+    index, error = get_library_index(steam_id, request.args.get('refresh', 'false').lower() == 'true', touch=True)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+
+    # The recent list depends on the day as well as the library
+    day = recent_day()
+    etag = hashlib.sha1(f"stats:{steam_id}:{index.fetched_at!r}:{top_n}:{day}".encode()).hexdigest()
+    last_modified = datetime.fromtimestamp(max(index.fetched_at, day * DAY), timezone.utc) if index.fetched_at is not None else None
+    cached = not_modified(etag, last_modified)
+    if cached is not None:
+        return cached
+    with timed_phase('stats'):
+        stats = index.stats(top_n)
+    print(f"Computed library stats for SteamID {steam_id} ({stats['total_games']} games)")
+    return set_validators(jsonify({"steam_id": steam_id, **stats}), etag, last_modified)
+
+EXPORT_BATCH_SIZE = 500
+EXPORT_CSV_COLUMNS = ['AppID', 'Name', 'Playtime (Hours)', 'Last Played', 'Playtime Last 2 Weeks (Hours)']
+EXPORT_CSV_DETAIL_COLUMNS = ['Genres', 'Release Date', 'Categories']
+
+def export_csv_row(game, details):
+    last_played = game.get('rtime_last_played') or 0
+    row = [
+        game['appid'],
+        game['name'],
+        (game.get('playtime_forever', 0) or 0) // 60,
+        datetime.fromtimestamp(last_played, timezone.utc).strftime('%Y-%m-%d') if last_played else 'Never',
+        (game.get('playtime_2weeks', 0) or 0) // 60
+    ]
+    if details is not None:
+        row += ['; '.join(details.get('genres', [])), details.get('release_date', ''), '; '.join(details.get('categories', []))]
+    return row
+
+def generate_export(index, positions, export_format, include_details):
+    """Yield the export body in batches so memory stays flat regardless of library size."""
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_CSV_COLUMNS + (EXPORT_CSV_DETAIL_COLUMNS if include_details else []))
+        yield buffer.getvalue()
+    for start in range(0, len(positions), EXPORT_BATCH_SIZE):
+        games = [index.games[i] for i in positions[start:start + EXPORT_BATCH_SIZE]]
+        details = get_stored_game_details([game['appid'] for game in games]) if include_details else {}
+        buffer = io.StringIO()
+        if export_format == 'csv':
+            writer = csv.writer(buffer)
+            for game in games:
+                writer.writerow(export_csv_row(game, details.get(game['appid'], {}) if include_details else None))
+        else:
+            for game in games:
+                if include_details:
+                    game = dict(game, details=details.get(game['appid'], {}))
+                buffer.write(json.dumps(game) + '\n')
+        yield buffer.getvalue()
+
+@app.route('/export_library', methods=['GET'])
+@auth.login_required
+@limiter.limit("5 per minute")
+def export_library():
+    profile = request.args.get('steamid') or request.args.get('username')
+    export_format = request.args.get('format', 'csv')
+    include_details = request.args.get('includeDetails', 'false').lower() == 'true'
+
+    if not profile:
+        print("No SteamID64 or username provided")
+        return jsonify({"error": "No SteamID64 or username provided"}), 400
+    if export_format not in ('csv', 'ndjson'):
+        print("Invalid export format")
+        return jsonify({"error": "Invalid format parameter"}), 400
+
+    query, error = parse_library_query(request.args)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+    steam_id, error = resolve_steam_id(profile)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+    index, error = get_library_index(steam_id, query['force_refresh'], touch=True)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+
+    positions = index.query(query['flags'], query['search'], query['date_range'], query['sort_by'])
+    print(f"Exporting {len(positions)} games for SteamID {steam_id} as {export_format}")
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(generate_export(index, positions, export_format, include_details)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=steam_library_{steam_id}.{export_format}'}
+    )
+
+# Resolves and loads several profiles' libraries in parallel for /compare
+profile_executor = ThreadPoolExecutor(max_workers=PROFILE_FETCH_WORKERS, thread_name_prefix='profile-fetch')
+
+def load_profile_index(profile):
+    """Return (steam_id, LibraryIndex, error) for a SteamID64 or custom URL name, from a worker thread."""
+    with app.app_context():
+        steam_id, error = resolve_steam_id(profile)
+        if error:
+            return None, None, error
+        index, error = get_library_index(steam_id, touch=True)
+        return steam_id, index, error
+
+@app.route('/compare', methods=['GET'])
+@auth.login_required
+@limiter.limit("10 per minute")
+def compare():
+    profiles = [profile.strip() for profile in request.args.get('ids', '').split(',') if profile.strip()]
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 50))
+    except ValueError:
+        print("Invalid pagination parameters")
         return jsonify({"error": "Invalid pagination parameters"}), 400
 
-    valid_sort_options = ['name', 'playtime', 'lastPlayed', 'playtime2Weeks']
-    if sort_by not in valid_sort_options:
-        print("Invalid sort_by parameter")
-        return jsonify({"error": "Invalid sort_by parameter"}), 400
+    if len(profiles) < 2 or len(profiles) > COMPARE_MAX_PROFILES:
+        print(f"Invalid number of profiles to compare: {len(profiles)}")
+        return jsonify({"error": f"Provide between 2 and {COMPARE_MAX_PROFILES} comma-separated SteamID64s or usernames in ids"}), 400
+    if page < 1 or per_page < 1 or per_page > 10000:
+        print(f"Invalid pagination parameters: page={page}, per_page={per_page}")
+        return jsonify({"error": "Invalid pagination parameters"}), 400
 
-    valid_date_ranges = ['all', 'last30Days', 'lastYear']
-    if date_range not in valid_date_ranges:
-        print("Invalid date_range parameter")
-        return jsonify({"error": "Invalid date_range parameter"}), 400
+    steam_ids = []
+    indexes = []
+    for profile, (steam_id, index, error) in zip(profiles, profile_executor.map(load_profile_index, profiles)):
+        if error:
+            return jsonify({"error": f"{profile}: {error[0]}"}), error[1]
+        if steam_id not in steam_ids:
+            steam_ids.append(steam_id)
+            indexes.append(index)
+    if len(steam_ids) < 2:
+        return jsonify({"error": "Provide at least two different profiles to compare"}), 400
 
-    print(f"Fetching library for SteamID64: {steam_id}")
-    library_url = f"http://api.steampowered.com/IPlayerService/GetOwnedGames/v0001/?key={API_KEY}&steamid={steam_id}&format=json&include_appinfo=true"
+    # A comparison only changes when one of the libraries is refetched
+    etag = hashlib.sha1(
+        f"{page}:{per_page}:".encode() + ','.join(f"{steam_id}@{index.fetched_at!r}" for steam_id, index in zip(steam_ids, indexes)).encode()
+    ).hexdigest()
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    start = (page - 1) * per_page
+    with timed_phase('compare'):
+        result = compare_indexes(steam_ids, indexes, start, start + per_page)
+    largest = max([result['common']['total']] + [section['total'] for section in result['unique'].values()])
+    result.update({
+        "page": page,
+        "per_page": per_page,
+        "total_pages": (largest + per_page - 1) // per_page if largest > 0 else 1
+    })
+    print(f"Compared {len(steam_ids)} libraries: {result['common']['total']} games in common")
+    return set_validators(jsonify(result), etag)
+
+@app.route('/search', methods=['GET'])
+@auth.login_required
+@limiter.limit("60 per minute")
+def search():
+    """Search game names across cached libraries, or only the libraries of the profiles in ids.
+
+    With ids, each result lists which of those profiles own the game ("which friends own X").
+    """
+    query = request.args.get('q', '').strip()
+    profiles = [profile.strip() for profile in request.args.get('ids', '').split(',') if profile.strip()]
     try:
-        time.sleep(0.5)
-        library_response = session.get(library_url, timeout=10)
-        if library_response.status_code == 400:
-            print("Steam API returned 400 - Invalid SteamID64 or profile does not exist")
-            return jsonify({"error": "Invalid SteamID64 or profile does not exist."}), 400
-        if library_response.status_code == 403:
-            print("Steam API returned 403 - Profile is private")
-            return jsonify({"error": "Profile is private. Please set your game details to public in Steam (Settings > Privacy)."}), 403
-        if library_response.status_code == 429:
-            print("Steam API returned 429 - Rate limit exceeded")
-            return jsonify({"error": "Rate limit exceeded. Please try again later."}), 429
-        library_response.raise_for_status()
-        library_data = library_response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Request error for SteamID {steam_id}: {str(e)}")
-        return jsonify({"error": f"Failed to fetch data from Steam API: {str(e)}"}), 500
-
-    if "response" in library_data and "games" in library_data["response"]:
-        games = library_data["response"]["games"]
-        filtered_games = [game for game in games if isinstance(game, dict) and 'appid' in game and 'name' in game]
-
-        if show_played_only:
-            filtered_games = [game for game in filtered_games if game.get('playtime_forever', 0) > 0]
-        if filter_windows:
-            filtered_games = [game for game in filtered_games if game.get('playtime_windows_forever', 0) > 0]
-        if filter_mac:
-            filtered_games = [game for game in filtered_games if game.get('playtime_mac_forever', 0) > 0]
-        if filter_linux:
-            filtered_games = [game for game in filtered_games if game.get('playtime_linux_forever', 0) > 0]
-        if filter_deck:
-            filtered_games = [game for game in filtered_games if game.get('playtime_deck_forever', 0) > 0]
-        if search_query:
-            filtered_games = [game for game in filtered_games if search_query in game.get('name', '').lower()]
-        if date_range != 'all':
-            now = int(time.time())
-            cutoff = now - (30 * 24 * 60 * 60) if date_range == 'last30Days' else now - (365 * 24 * 60 * 60)
-            filtered_games = [game for game in filtered_games if 'rtime_last_played' in game and game['rtime_last_played'] and game['rtime_last_played'] >= cutoff]
-
-        if sort_by == 'name':
-            filtered_games = sorted(filtered_games, key=lambda x: x.get('name', '').lower())
-        elif sort_by == 'playtime':
-            filtered_games = sorted(filtered_games, key=lambda x: x.get('playtime_forever', 0), reverse=True)
-        elif sort_by == 'lastPlayed':
-            filtered_games = sorted(filtered_games, key=lambda x: x.get('rtime_last_played', 0), reverse=True)
-        elif sort_by == 'playtime2Weeks':
-            filtered_games = sorted(filtered_games, key=lambda x: x.get('playtime_2weeks', 0), reverse=True)
-
-        total_games = len(filtered_games)
-        if per_page <= 0:
-            per_page = 50
-        start = max(0, (page - 1) * per_page)
-        end = min(start + per_page, total_games)
-        paginated_games = filtered_games[start:end]
-        total_pages = (total_games + per_page - 1) // per_page if total_games > 0 else 1
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({"error": "Invalid limit parameter"}), 400
+    if not query:
+        return jsonify({"error": "No search query provided"}), 400
+    if not 1 <= limit <= SEARCH_MAX_RESULTS:
+        return jsonify({"error": f"limit must be between 1 and {SEARCH_MAX_RESULTS}"}), 400
+    if len(profiles) > SEARCH_MAX_PROFILES:
+        return jsonify({"error": f"Provide at most {SEARCH_MAX_PROFILES} profiles in ids"}), 400
+
+    load_library_search()
+    steam_ids = None
+    if profiles:
+        steam_ids = []
+        for profile, (steam_id, index, error) in zip(profiles, profile_executor.map(load_profile_index, profiles)):
+            if error:
+                return jsonify({"error": f"{profile}: {error[0]}"}), error[1]
+            steam_ids.append(steam_id)
+
+    with timed_phase('search'):
+        results = library_search.search(query, limit, steam_ids)
+    if steam_ids is None:
+        # Don't reveal which profiles other users have looked up
+        for result in results:
+            result['owners'] = len(result['owners'])
+    return jsonify({"query": query, "results": results})
+
+def sync_watched_profiles():
+    """Refetch every watched profile that is due and record its playtime deltas.
 
-        if fetch_details:
-            for game in paginated_games:
-                game['details'] = fetch_game_details(game['appid'])
+    Each profile is claimed first by moving its last_synced_at forward, conditional on the
+    value read here, so when several server processes sync at once only one fetches it.
+    A failed or interrupted sync is therefore retried at the next interval rather than on
+    every wake-up.
+    """
+    cutoff = time.time() - HISTORY_SYNC_INTERVAL
+    due = db.session.query(WatchedProfile.steam_id, WatchedProfile.last_synced_at).filter(
+        db.or_(WatchedProfile.last_synced_at.is_(None), WatchedProfile.last_synced_at <= cutoff)
+    ).order_by(WatchedProfile.last_synced_at.asc()).all()
+    for steam_id, last_synced_at in due:
+        unchanged = (WatchedProfile.last_synced_at.is_(None) if last_synced_at is None
+                     else WatchedProfile.last_synced_at == last_synced_at)
+        claimed = db.session.execute(db.update(WatchedProfile).where(WatchedProfile.steam_id == steam_id, unchanged)
+                                     .values(last_synced_at=time.time())).rowcount
+        db.session.commit()
+        if not claimed:
+            continue
+        index, error = get_library_index(steam_id, force_refresh=True)
+        if not error:
+            record_playtime(steam_id, index.games, index.fetched_at)
         else:
-            for game in paginated_games:
-                game['details'] = {}
-
-        response = {
-            "steam_id": steam_id,
-            "games": paginated_games,
-            "total_games": total_games,
-            "page": page,
-            "per_page": per_page,
-            "total_pages": total_pages
-        }
-        print(f"Successfully fetched {len(paginated_games)} games for SteamID {steam_id} (page {page}, total filtered: {total_games})")
-        return jsonify(response)
-    else:
-        print(f"No games found for SteamID {steam_id} or profile is private")
-        return jsonify({"error": "No games found or profile is private"}), 404
+            print(f"Playtime sync failed for SteamID {steam_id}: {error[0]}")
+            profile = db.session.get(WatchedProfile, steam_id)
+            if profile is not None:
+                profile.last_error = error[0]
+                db.session.commit()
+
+# Set to sync newly watched profiles without waiting for the next check
+history_sync_wakeup = threading.Event()
+
+def history_sync_loop():
+    while True:
+        try:
+            with app.app_context():
+                sync_watched_profiles()
+        except Exception as e:
+            print(f"Playtime sync error: {str(e)}")
+        history_sync_wakeup.wait(min(HISTORY_SYNC_INTERVAL, 60))
+        history_sync_wakeup.clear()
+
+@app.route('/watched_profiles', methods=['GET', 'POST', 'DELETE'])
+@auth.login_required
+@limiter.limit("10 per minute")
+def watched_profiles():
+    if request.method == 'GET':
+        profiles = WatchedProfile.query.order_by(WatchedProfile.added_at.asc()).all()
+        return jsonify({"profiles": [{
+            "steam_id": profile.steam_id,
+            "added_by": profile.added_by,
+            "added_at": profile.added_at,
+            "first_synced_at": profile.first_synced_at,
+            "last_synced_at": profile.last_synced_at,
+            "last_error": profile.last_error
+        } for profile in profiles]})
+
+    data = request.get_json(silent=True) or {}
+    profile = data.get('steamid') or data.get('username') or request.args.get('steamid') or request.args.get('username')
+    if not profile:
+        return jsonify({"error": "Provide a steamid or username"}), 400
+    steam_id, error = resolve_steam_id(profile)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+
+    watched = db.session.get(WatchedProfile, steam_id)
+    if request.method == 'DELETE':
+        # Recorded history is kept so the profile can be watched again later
+        if watched is None:
+            return jsonify({"error": "Profile is not watched"}), 404
+        db.session.delete(watched)
+        db.session.commit()
+        return jsonify({"message": "Profile is no longer watched", "steam_id": steam_id})
+
+    if watched is not None:
+        return jsonify({"message": "Profile is already watched", "steam_id": steam_id})
+    db.session.add(WatchedProfile(steam_id=steam_id, added_by=auth.current_user(), added_at=time.time()))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+    history_sync_wakeup.set()
+    return jsonify({"message": "Profile is now watched", "steam_id": steam_id}), 201
+
+def history_bucket_start(timestamp, bucket):
+    if bucket == 'month':
+        date = datetime.fromtimestamp(timestamp, timezone.utc)
+        return datetime(date.year, date.month, 1, tzinfo=timezone.utc).timestamp()
+    return timestamp - timestamp % HISTORY_BUCKETS[bucket]
+
+@app.route('/playtime_history', methods=['GET'])
+@auth.login_required
+@limiter.limit("10 per minute")
+def playtime_history():
+    """Playtime gained in [start, end) from recorded snapshots; never calls Steam."""
+    profile = request.args.get('steamid') or request.args.get('username')
+    if not profile:
+        return jsonify({"error": "No username or SteamID64 provided"}), 400
+    now = time.time()
+    try:
+        start = float(request.args.get('start', now - 30 * 24 * 60 * 60))
+        end = float(request.args.get('end', now))
+        top_n = int(request.args.get('top', 20))
+        appid = int(request.args['appid']) if request.args.get('appid') else None
+    except ValueError:
+        return jsonify({"error": "Invalid start, end, top or appid parameter"}), 400
+    if not (math.isfinite(start) and math.isfinite(end)):
+        return jsonify({"error": "Invalid start, end, top or appid parameter"}), 400
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in HISTORY_BUCKETS:
+        return jsonify({"error": f"bucket must be one of {', '.join(HISTORY_BUCKETS)}"}), 400
+    if start >= end or not 1 <= top_n <= LIBRARY_STATS_MAX_TOP:
+        return jsonify({"error": "Invalid time window or top parameter"}), 400
+
+    # Custom URL names may need one ResolveVanityURL call, usually answered by VanityCache
+    steam_id, error = resolve_steam_id(profile)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+    watched = db.session.get(WatchedProfile, steam_id)
+    first_synced_at = watched.first_synced_at if watched else None
+    if first_synced_at is None:
+        first_synced_at = db.session.query(db.func.min(PlaytimeDelta.synced_at)).filter_by(steam_id=steam_id).scalar()
+        if first_synced_at is None:
+            return jsonify({"error": "No playtime history recorded for this profile; watch it via /watched_profiles"}), 404
+
+    filters = [PlaytimeDelta.steam_id == steam_id, PlaytimeDelta.synced_at >= start, PlaytimeDelta.synced_at < end]
+    if appid is not None:
+        filters.append(PlaytimeDelta.appid == appid)
+    sums = [db.func.sum(getattr(PlaytimeDelta, column)) for column in PLAYTIME_COLUMNS]
+
+    # One row per snapshot in the window, then bucketed here so it works on any database
+    series = {}
+    for row in db.session.query(PlaytimeDelta.synced_at, *sums).filter(*filters).group_by(PlaytimeDelta.synced_at):
+        key = history_bucket_start(row[0], bucket) if HISTORY_BUCKETS[bucket] else start
+        totals = series.setdefault(key, [0] * len(PLAYTIME_COLUMNS))
+        for i, value in enumerate(row[1:]):
+            totals[i] += value or 0
+    totals = [sum(values[i] for values in series.values()) for i in range(len(PLAYTIME_COLUMNS))]
+
+    top_rows = (db.session.query(PlaytimeDelta.appid, PlaytimeState.name, *sums)
+                .join(PlaytimeState, db.and_(PlaytimeState.steam_id == PlaytimeDelta.steam_id,
+                                             PlaytimeState.appid == PlaytimeDelta.appid))
+                .filter(*filters)
+                .group_by(PlaytimeDelta.appid, PlaytimeState.name)
+                .order_by(sums[0].desc())
+                .limit(top_n)
+                .all())
+
+    def playtime_dict(values):
+        return {column: value or 0 for column, value in zip(PLAYTIME_COLUMNS, values)}
+
+    return jsonify({
+        "steam_id": steam_id,
+        "start": start,
+        "end": end,
+        "bucket": bucket,
+        # Playtime before the first snapshot is unknown, so earlier windows are incomplete
+        "history_starts_at": first_synced_at,
+        "last_synced_at": watched.last_synced_at if watched else None,
+        "totals": playtime_dict(totals),
+        "series": [{"start": key, **playtime_dict(series[key])} for key in sorted(series)],
+        "games": [{"appid": row[0], "name": row[1], **playtime_dict(row[2:])} for row in top_rows]
+    })
+
+def fetch_player_achievements(steam_id, appid):
+    """Call GetPlayerAchievements and return (status, data) where data is playerstats or an error body.
+
+    Raises RateLimited on 429 and RequestException on transport errors.
+    """
+    url = f"{STEAM_API_BASE}/ISteamUserStats/GetPlayerAchievements/v0001/?key={API_KEY}&steamid={steam_id}&appid={appid}"
+    response = steam_get(url, timeout=5)
+    if response.status_code == 429:
+        raise RateLimited()
+    if response.status_code == 400:
+        return 400, {"error": "Invalid SteamID64 or AppID."}
+    if response.status_code == 403:
+        return 403, {"error": "Profile is private. Please set your game details to public in Steam (Settings > Privacy)."}
+    response.raise_for_status()
+    data = response.json()
+    if data.get("playerstats", {}).get("success"):
+        return 200, data["playerstats"]
+    return 404, {"error": "No achievements found or profile is private"}
+
+def fetch_and_store_achievements(key):
+    """Fetch one (steam_id, appid) pair and cache the outcome; transport errors are not cached."""
+    steam_id, appid = key
+    with app.app_context():
+        try:
+            status, data = fetch_player_achievements(steam_id, appid)
+        except requests.exceptions.RequestException as e:
+            print(f"Request error for achievements (SteamID {steam_id}, appid {appid}): {str(e)}")
+            return 500, {"error": f"Failed to fetch achievements from Steam API: {str(e)}"}
+        entry = db.session.get(AchievementCache, (steam_id, appid)) or AchievementCache(steam_id=steam_id, appid=appid)
+        entry.status = status
+        entry.data_json = json.dumps(data)
+        entry.fetched_at = time.time()
+        db.session.add(entry)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+        return status, data
+
+# All GetPlayerAchievements traffic shares one Web API token bucket
+web_api_bucket = TokenBucket(WEB_API_RATE * ACHIEVEMENTS_API_SHARE / SERVER_PROCESSES,
+                             max(1, int(WEB_API_BURST * ACHIEVEMENTS_API_SHARE) // SERVER_PROCESSES))
+achievements_fetcher = ConcurrentFetcher(fetch_and_store_achievements, web_api_bucket, ACHIEVEMENT_FETCH_WORKERS, name='achievements-fetch')
+
+@timed_phase('achievements')
+def get_player_achievements(steam_id, appids, timeout=ACHIEVEMENT_FETCH_TIMEOUT):
+    """Return ({appid: (status, data)}, pending_appids), fetching only entries missing or older than the TTL."""
+    appids = [int(appid) for appid in appids]
+    cutoff = time.time() - ACHIEVEMENT_CACHE_TTL
+    entries = AchievementCache.query.filter(
+        AchievementCache.steam_id == steam_id,
+        AchievementCache.appid.in_(appids),
+        AchievementCache.fetched_at >= cutoff
+    ).all() if appids else []
+    result = {entry.appid: (entry.status, json.loads(entry.data_json)) for entry in entries}
+    missing = [(steam_id, appid) for appid in appids if appid not in result]
+    cache_lookups.inc(len(result), cache='achievements', result='hit')
+    cache_lookups.inc(len(missing), cache='achievements', result='miss')
+    for (_, appid), outcome in achievements_fetcher.imap_unordered(missing, timeout=timeout):
+        result[appid] = outcome or (429, {"error": "Rate limit exceeded. Please try again later."})
+    pending = [appid for _, appid in missing if appid not in result]
+    return result, pending
 
 @app.route('/get_achievements', methods=['GET'])
 @auth.login_required
@@ -361,21 +1551,282 @@ def get_achievements():
         print("Invalid AppID")
         return jsonify({"error": "Invalid AppID"}), 400
 
-    url = f"http://api.steampowered.com/ISteamUserStats/GetPlayerAchievements/v0001/?key={API_KEY}&steamid={steam_id}&appid={appid}"
+    results, pending = get_player_achievements(steam_id, [appid])
+    if pending:
+        return jsonify({"error": "Achievements are still loading. Please try again shortly."}), 503
+    status, data = results[int(appid)]
+    return jsonify(data), status
+
+def summarize_achievements(playerstats):
+    achievements = playerstats.get('achievements', [])
+    achieved = sum(1 for achievement in achievements if achievement.get('achieved'))
+    return achieved, len(achievements)
+
+@app.route('/get_achievements_bulk', methods=['GET'])
+@auth.login_required
+@limiter.limit("5 per minute")
+def get_achievements_bulk():
+    steam_id = request.args.get('steamid')
+    appids_arg = request.args.get('appids', 'played')
+    include_achievements = request.args.get('includeAchievements', 'false').lower() == 'true'
+
+    if not steam_id or not steam_id.isdigit() or len(steam_id) != 17:
+        print("Invalid SteamID64 format")
+        return jsonify({"error": "Invalid SteamID64"}), 400
+
+    names = {}
+    truncated = False
+    if appids_arg == 'played':
+        index, error = get_library_index(steam_id, touch=True)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        # Most played first, so a capped list keeps the games that matter most
+        positions = index.query(PLAYED, sort_by='playtime')
+        truncated = len(positions) > BULK_ACHIEVEMENTS_MAX_PLAYED
+        played = [index.games[i] for i in positions[:BULK_ACHIEVEMENTS_MAX_PLAYED]]
+        appids = [game['appid'] for game in played]
+        names = {game['appid']: game['name'] for game in played}
+    else:
+        appids = [appid.strip() for appid in appids_arg.split(',') if appid.strip()]
+        if not appids or not all(appid.isdigit() for appid in appids):
+            print("Invalid AppID list")
+            return jsonify({"error": "Invalid AppID list"}), 400
+        if len(appids) > BULK_ACHIEVEMENTS_MAX_APPIDS:
+            return jsonify({"error": f"At most {BULK_ACHIEVEMENTS_MAX_APPIDS} AppIDs per request"}), 400
+        appids = list(dict.fromkeys(int(appid) for appid in appids))
+
+    results, pending = get_player_achievements(steam_id, appids)
+    games = []
+    total_achieved = 0
+    total_achievements = 0
+    completions = []
+    for appid in appids:
+        if appid not in results:
+            continue
+        status, data = results[appid]
+        game = {"appid": appid, "name": data.get('gameName') or names.get(appid), "status": status}
+        if status == 200:
+            achieved, total = summarize_achievements(data)
+            game.update({"achieved": achieved, "total": total,
+                         "completion": round(100 * achieved / total, 1) if total else None})
+            if include_achievements:
+                game["achievements"] = data.get('achievements', [])
+            if total:
+                total_achieved += achieved
+                total_achievements += total
+                completions.append(achieved / total)
+        else:
+            game["error"] = data.get('error')
+        games.append(game)
+
+    summary = {
+        "games_with_achievements": len(completions),
+        "perfect_games": sum(1 for completion in completions if completion == 1),
+        "achieved": total_achieved,
+        "total": total_achievements,
+        "overall_completion": round(100 * total_achieved / total_achievements, 1) if total_achievements else None,
+        "average_completion": round(100 * sum(completions) / len(completions), 1) if completions else None
+    }
+    print(f"Served achievements for {len(games)} games for SteamID {steam_id} ({len(pending)} pending)")
+    return jsonify({"steam_id": steam_id, "summary": summary, "games": games, "pending": pending, "truncated": truncated})
+
+# User-facing requests in progress; the warm-up worker waits while any are running
+active_user_requests = 0
+active_user_requests_lock = threading.Lock()
+WARMUP_IGNORED_ENDPOINTS = {'static', 'prometheus_metrics', 'warmup_status', 'upstream_stats'}
+
+@app.before_request
+def count_user_request():
+    global active_user_requests
+    if request.endpoint in WARMUP_IGNORED_ENDPOINTS:
+        return
+    with active_user_requests_lock:
+        active_user_requests += 1
+    g.counted_user_request = True
+
+@app.teardown_request
+def uncount_user_request(exc=None):
+    global active_user_requests
+    if g.pop('counted_user_request', False):
+        with active_user_requests_lock:
+            active_user_requests -= 1
+
+def user_requests_waiting():
+    """True while a user request is being served, including any waiting on detail/achievement fetches.
+
+    The fetchers' own queues are not consulted: they also hold stale-detail refreshes
+    and calls a request gave up waiting for, neither of which a user is waiting on.
+    """
+    return active_user_requests > 0
+
+# Warm-up jobs draw from their own buckets, sized to WARMUP_API_SHARE of each budget, as well as the bucket the
+# matching user-facing fetch uses, if any (library and vanity lookups are not metered; only achievements use web_api_bucket)
+warmup_web_bucket = TokenBucket(WEB_API_RATE * WARMUP_API_SHARE, max(1, int(WEB_API_BURST * WARMUP_API_SHARE)))
+warmup_store_bucket = TokenBucket(STORE_API_RATE * WARMUP_API_SHARE, max(1, int(STORE_API_BURST * WARMUP_API_SHARE)))
+warmup = WarmupScheduler(user_requests_waiting)
+
+# Lower runs first: users' own profiles, then recently requested ones, then popular apps' details
+PRIORITY_LINKED = 0
+PRIORITY_RECENT = 1
+PRIORITY_POPULAR = 2
+
+def warm_library(steam_id):
+    """Refetch a library and precompute the dashboard stats for it."""
+    with app.app_context():
+        index, error = get_library_index(steam_id, force_refresh=True)
+        if error:
+            if error[1] == 429:
+                raise RateLimited()
+            return error[0]
+        index.stats()
+
+def warm_library_index(steam_id):
+    """Parse a library that is still fresh in LibraryCache but not held in memory."""
+    with app.app_context():
+        index, error = get_library_index(steam_id)
+        if error:
+            return error[0]
+        index.stats()
+
+def warm_vanity(vanity):
+    with app.app_context():
+        _, error = resolve_vanity_name(vanity, force_refresh=True)
+        # Names that no longer exist are cached as such; only transport errors are worth retrying
+        if error and error[1] != 404:
+            return error[0]
+
+def warm_app_details(appid):
+    details = fetch_and_store_game_details(appid)
+    # None is a transport error and {} an app the store returned nothing for; both back off
+    if details is None:
+        return "Store request failed"
+    if not details:
+        return "No store details"
+
+warmup.register('library', warm_library, warmup_web_bucket)
+warmup.register('library_index', warm_library_index)
+warmup.register('vanity', warm_vanity, warmup_web_bucket)
+warmup.register('app_details', warm_app_details, warmup_store_bucket, store_api_bucket)
+
+def queue_library_warmup(steam_ids, priority, now):
+    """Queue refreshes of the given libraries, and of the names that resolve to them, that are due."""
+    entries = {steam_id: (fetched_at, last_accessed) for steam_id, fetched_at, last_accessed in db.session.query(
+        LibraryCache.steam_id, LibraryCache.fetched_at, LibraryCache.last_accessed).filter(LibraryCache.steam_id.in_(steam_ids))}
+    parsed = []
+    for steam_id in steam_ids:
+        fetched_at = entries.get(steam_id, (0, 0))[0]
+        if now - fetched_at >= WARMUP_REFRESH_AT * LIBRARY_CACHE_TTL:
+            warmup.enqueue('library', steam_id, priority, fetched_at)
+        elif cached_library_index(steam_id, fetched_at) is None:
+            parsed.append((entries[steam_id][1], steam_id))
+    # Only as many as the in-memory cache holds, most recently used first, so warming doesn't evict itself
+    for last_accessed, steam_id in sorted(parsed, reverse=True)[:LIBRARY_INDEX_CACHE_SIZE]:
+        warmup.enqueue('library_index', steam_id, priority, -last_accessed)
+
+    due = now - WARMUP_REFRESH_AT * VANITY_CACHE_TTL
+    for vanity, resolved_at in db.session.query(VanityCache.vanity, VanityCache.resolved_at).filter(
+            VanityCache.steam_id.in_(steam_ids), VanityCache.resolved_at <= due):
+        warmup.enqueue('vanity', vanity, priority, resolved_at)
+
+def plan_warmup():
+    """Queue refreshes for linked and recently requested profiles and for the most-owned apps' details."""
+    with app.app_context():
+        now = time.time()
+        linked = {steam_id for (steam_id,) in db.session.query(LinkedProfile.steam_id)}
+        recent = {steam_id for (steam_id,) in db.session.query(LibraryCache.steam_id).filter(
+            LibraryCache.last_accessed >= now - WARMUP_RECENT_WINDOW)} - linked
+        queue_library_warmup(linked, PRIORITY_LINKED, now)
+        queue_library_warmup(recent, PRIORITY_RECENT, now)
+
+        load_library_search()
+        appids = library_search.most_owned(WARMUP_TOP_APPS)
+        entries = {entry.appid: entry for entry in AppDetails.query.options(defer(AppDetails.details_json)).filter(
+            AppDetails.appid.in_(appids))} if appids else {}
+        for rank, appid in enumerate(appids):
+            entry = entries.get(appid)
+            ttl = APP_DETAILS_TTL if entry is None or entry.success else APP_DETAILS_NEGATIVE_TTL
+            if entry is None or now - entry.fetched_at >= WARMUP_REFRESH_AT * ttl:
+                warmup.enqueue('app_details', appid, PRIORITY_POPULAR, rank)
+
+@app.route('/linked_profile', methods=['GET', 'POST', 'DELETE'])
+@auth.login_required
+@limiter.limit("10 per minute")
+def linked_profile():
+    user = User.query.filter_by(username=auth.current_user()).first()
+    linked = db.session.get(LinkedProfile, user.id)
+    if request.method == 'GET':
+        if linked is None:
+            return jsonify({"error": "No profile linked"}), 404
+        return jsonify({"steam_id": linked.steam_id, "linked_at": linked.linked_at})
+
+    if request.method == 'DELETE':
+        if linked is None:
+            return jsonify({"error": "No profile linked"}), 404
+        db.session.delete(linked)
+        db.session.commit()
+        return jsonify({"message": "Profile unlinked", "steam_id": linked.steam_id})
+
+    data = request.get_json(silent=True) or {}
+    profile = data.get('steamid') or data.get('username') or request.args.get('steamid') or request.args.get('username')
+    if not profile:
+        return jsonify({"error": "Provide a steamid or username"}), 400
+    steam_id, error = resolve_steam_id(profile)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+
+    status = 200 if linked is not None else 201
+    if linked is None:
+        linked = LinkedProfile(user_id=user.id)
+        db.session.add(linked)
+    linked.steam_id = steam_id
+    linked.linked_at = time.time()
     try:
-        response = session.get(url, timeout=5)
-        if response.status_code == 400:
-            return jsonify({"error": "Invalid SteamID64 or AppID."}), 400
-        if response.status_code == 403:
-            return jsonify({"error": "Profile is private. Please set your game details to public in Steam (Settings > Privacy)."}), 403
-        response.raise_for_status()
-        data = response.json()
-        if data.get("playerstats", {}).get("success"):
-            return jsonify(data["playerstats"])
-        return jsonify({"error": "No achievements found or profile is private"}), 404
-    except requests.exceptions.RequestException as e:
-        print(f"Request error for achievements (SteamID {steam_id}, appid {appid}): {str(e)}")
-        return jsonify({"error": f"Failed to fetch achievements from Steam API: {str(e)}"}), 500
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+    if WARMUP_ENABLED:
+        queue_library_warmup({steam_id}, PRIORITY_LINKED, time.time())
+    return jsonify({"message": "Profile linked", "steam_id": steam_id}), status
+
+@app.route('/warmup_status', methods=['GET'])
+@auth.login_required
+@limiter.exempt
+def warmup_status():
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({"error": "Invalid limit parameter"}), 400
+    return jsonify({"enabled": WARMUP_ENABLED, "user_requests": active_user_requests, **warmup.snapshot(max(0, limit))})
+
+@app.route('/upstream_stats', methods=['GET'])
+@auth.login_required
+def upstream_stats():
+    return jsonify(upstream_calls.stats())
+
+metrics.callback_counter('steam_upstream_calls_total', 'Upstream GETs executed vs. collapsed into an in-flight call',
+                         lambda: {(key,): value for key, value in upstream_calls.stats().items() if key != 'in_flight'},
+                         ['kind'])
+metrics.gauge('steam_upstream_calls_in_flight', 'Upstream GETs currently executing',
+              lambda: {(): upstream_calls.stats()['in_flight']})
+metrics.gauge('fetcher_bucket_rate', 'Current token bucket refill rate (requests per second) after 429 backoff',
+              lambda: {('store',): store_api_bucket.rate, ('web_api',): web_api_bucket.rate}, ['bucket'])
+
+metrics.gauge('library_snapshots', 'Paging snapshots held in memory, the libraries they pin and their estimated bytes',
+              lambda: {(key,): value for key, value in library_snapshots.stats().items()}, ['kind'])
+
+metrics.gauge('warmup_queue', 'Warm-up jobs queued and backing off after a failure',
+              lambda: {(key,): value for key, value in warmup.stats().items()}, ['kind'])
+metrics.callback_counter('warmup_jobs_total', 'Warm-up jobs run by kind and outcome',
+                         warmup.job_counts, ['kind', 'outcome'])
+
+metrics.gauge('search_index', 'Apps, libraries and name tokens in the cross-library search index',
+              lambda: {(key,): value for key, value in library_search.stats().items()}, ['kind'])
+
+@app.route('/metrics', methods=['GET'])
+@auth.login_required
+@limiter.exempt
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/register', methods=['POST'])
 @limiter.limit("5 per minute")
@@ -393,6 +1844,61 @@ def register():
     db.session.commit()
     return jsonify({"message": "User registered successfully"}), 201
 
+# Create any tables added since init_db.py was run (e.g. caches); existing tables are left untouched
+with app.app_context():
+    db.create_all()
+    for steam_id in HISTORY_WATCH_IDS:
+        if db.session.get(WatchedProfile, steam_id) is None:
+            db.session.add(WatchedProfile(steam_id=steam_id, added_at=time.time()))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker process seeded the same IDs
+        db.session.rollback()
+
+def try_background_lock(path):
+    """Return an open handle holding an exclusive lock on path, or None if another process holds it.
+
+    The lock is released by the OS when the process exits.
+    """
+    handle = open(path, 'a+')
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+background_lock = None
+
+def start_background_jobs():
+    """Start the playtime sync and warm-up threads once this process holds the background lock."""
+    global background_lock
+    while background_lock is None:
+        background_lock = try_background_lock(BACKGROUND_LOCK_FILE)
+        if background_lock is None:
+            time.sleep(BACKGROUND_LOCK_RETRY)
+    print(f"Running background jobs in process {os.getpid()}")
+    if HISTORY_SYNC_INTERVAL > 0:
+        threading.Thread(target=history_sync_loop, name='history-sync', daemon=True).start()
+    if WARMUP_ENABLED:
+        warmup.start(plan_warmup, WARMUP_PLAN_INTERVAL)
+
+def start_background():
+    """Start competing for the background lock; called by the process that serves requests.
+
+    Importing app (init_db.py, scripts, the debug reloader's watcher process) starts nothing.
+    """
+    if HISTORY_SYNC_INTERVAL > 0 or WARMUP_ENABLED:
+        threading.Thread(target=start_background_jobs, name='background-lock', daemon=True).start()
+
 # No hardcoded user creation here anymore; handled by init_db.py
 if __name__ == "__main__":
+    # With the debug reloader only the child process (WERKZEUG_RUN_MAIN set) serves requests
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""Benchmark LibraryIndex against the old per-request filter/sort chain.
+
+Usage: python benchmarks/bench_library_query.py [--games 50000] [--repeat 20]
+
+Builds a synthetic library, then reports the one-off index build cost and the
+per-request cost of a few representative parameter mixes for both approaches.
+Name searches go through a LibrarySearch holding the library, as in the app; the
+cost of building a private NameIndex instead is reported for comparison.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library_query import LibraryIndex, PLAYED, WINDOWS, LINUX, DECK  # noqa: E402
+from search_index import LibrarySearch  # noqa: E402
+
+WORDS = ['the', 'witcher', 'dark', 'souls', 'half', 'life', 'portal', 'counter', 'strike', 'age', 'empires',
+         'civilization', 'factorio', 'stardew', 'valley', 'hollow', 'knight', 'doom', 'eternal', 'racing']
+
+MIXES = [
+    ('default (name sort)', {}),
+    ('playtime sort', {'sort_by': 'playtime'}),
+    ('played + windows, lastPlayed', {'flags': PLAYED | WINDOWS, 'sort_by': 'lastPlayed'}),
+    ('search "souls"', {'search': 'souls'}),
+    ('linux + deck, last year', {'flags': LINUX | DECK, 'date_range': 'lastYear', 'sort_by': 'playtime2Weeks'}),
+]
+
+
+def synthetic_library(count, seed=0):
+    rng = random.Random(seed)
+    now = int(time.time())
+    games = []
+    for appid in range(10, 10 + count * 10, 10):
+        played = rng.random() < 0.6
+        playtime = rng.randint(1, 50000) if played else 0
+        games.append({
+            'appid': appid,
+            'name': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title() + f' {appid}',
+            'playtime_forever': playtime,
+            'playtime_2weeks': rng.randint(0, 600) if played and rng.random() < 0.1 else 0,
+            'playtime_windows_forever': playtime if rng.random() < 0.9 else 0,
+            'playtime_mac_forever': playtime if rng.random() < 0.1 else 0,
+            'playtime_linux_forever': playtime if rng.random() < 0.2 else 0,
+            'playtime_deck_forever': playtime if rng.random() < 0.15 else 0,
+            'rtime_last_played': now - rng.randint(0, 5 * 365 * 24 * 60 * 60) if played else 0,
+        })
+    return games
+
+
+def legacy_query(games, flags=0, search='', date_range='all', sort_by='name'):
+    """The filter/sort chain the library endpoints ran on every request before LibraryIndex."""
+    filtered = [game for game in games if isinstance(game, dict) and 'appid' in game and 'name' in game]
+    if flags & PLAYED:
+        filtered = [game for game in filtered if game.get('playtime_forever', 0) > 0]
+    if flags & WINDOWS:
+        filtered = [game for game in filtered if game.get('playtime_windows_forever', 0) > 0]
+    if flags & LINUX:
+        filtered = [game for game in filtered if game.get('playtime_linux_forever', 0) > 0]
+    if flags & DECK:
+        filtered = [game for game in filtered if game.get('playtime_deck_forever', 0) > 0]
+    if search:
+        filtered = [game for game in filtered if search in game.get('name', '').lower()]
+    if date_range != 'all':
+        now = int(time.time())
+        cutoff = now - (30 * 24 * 60 * 60) if date_range == 'last30Days' else now - (365 * 24 * 60 * 60)
+        filtered = [game for game in filtered if game.get('rtime_last_played') and game['rtime_last_played'] >= cutoff]
+    if sort_by == 'name':
+        filtered = sorted(filtered, key=lambda x: x.get('name', '').lower())
+    elif sort_by == 'playtime':
+        filtered = sorted(filtered, key=lambda x: x.get('playtime_forever', 0), reverse=True)
+    elif sort_by == 'lastPlayed':
+        filtered = sorted(filtered, key=lambda x: x.get('rtime_last_played', 0), reverse=True)
+    elif sort_by == 'playtime2Weeks':
+        filtered = sorted(filtered, key=lambda x: x.get('playtime_2weeks', 0), reverse=True)
+    return filtered
+
+
+def best_of(repeat, fn):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    games = synthetic_library(args.games)
+    search = LibrarySearch()
+    start = time.perf_counter()
+    search.update_library('library', games)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    def name_search(query, ranked):
+        return search.library_matches('library', query, ranked)
+
+    build_ms = best_of(3, lambda: LibraryIndex(games, name_search=name_search))
+    index = LibraryIndex(games, name_search=name_search)
+    # Refetches usually change a few games, which is all the shared index re-indexes
+    changed = [dict(game, name=game['name'] + ' Remastered') if i % 100 == 0 else game for i, game in enumerate(games)]
+    start = time.perf_counter()
+    search.update_library('library', changed)
+    search.update_library('library', games)
+    refresh_ms = (time.perf_counter() - start) * 1000 / 2
+    private_ms = best_of(3, lambda: LibraryIndex(games).search_positions('souls'))
+    print(f"{args.games} games, index build: {build_ms:.1f} ms (once per cached library)")
+    print(f"shared search index: {load_ms:.0f} ms to add the library, {refresh_ms:.1f} ms per refetch with 1% changed")
+    print(f"first search with a private NameIndex instead: {private_ms:.0f} ms")
+    print(f"{'parameter mix':<32}{'legacy ms':>12}{'index ms':>12}{'matches':>10}")
+    for label, params in MIXES:
+        legacy_ms = best_of(args.repeat, lambda: legacy_query(games, **params))
+        # Clear memoised search matches so every run searches the shared index again
+        index_ms = best_of(args.repeat, lambda: (index.search_cache.clear(), index.page(index.query(**params), 0, 50)))
+        matches = len(index.query(**params))
+        assert [game['appid'] for game in legacy_query(games, **params)] == [index.games[i]['appid'] for i in index.query(**params)]
+        print(f"{label:<32}{legacy_ms:>12.2f}{index_ms:>12.2f}{matches:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Benchmark the name search index against a linear substring scan.
+
+Usage: python benchmarks/bench_search.py [--names 50000] [--libraries 20] [--queries 200]
+
+Builds a catalogue of synthetic game names, indexes it, and reports p50/p99
+lookup latency per query type, the cost of a cross-library search restricted
+to a few profiles and of applying a refreshed library incrementally.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import LibrarySearch, NameIndex, normalize  # noqa: E402
+
+# Made-up words are 2-3 syllables of onset + vowel + optional coda, mixed with common title words
+ONSETS = ['b', 'c', 'd', 'f', 'g', 'h', 'k', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'w', 'z', 'br', 'cr', 'dr',
+          'gr', 'st', 'sh', 'th', 'tr', 'ch', '']
+VOWELS = ['a', 'e', 'i', 'o', 'u', 'ai', 'ou', 'y']
+CODAS = ['', '', '', 'n', 'r', 'l', 's', 'x', 'th', 'rd', 'nt']
+COMMON = ['the', 'of', 'simulator', 'legends', 'dark', 'souls', 'space', 'tales', 'edition', 'remastered', 'online',
+          'chronicles', 'war', 'night', 'city', 'quest', 'racing', 'tycoon', 'heroes', 'dungeon']
+SUFFIXES = ['', '', '', ' 2', ' 3', ' II', ' III', '™', '®', ': Deluxe Edition', ' - Soundtrack', ' (Beta)']
+GENRES = ['Action', 'Adventure', 'RPG', 'Strategy', 'Simulation', 'Indie', 'Racing', 'Sports', 'Puzzle']
+
+
+def synthetic_names(count, seed=0):
+    rng = random.Random(seed)
+
+    def word():
+        if rng.random() < 0.35:
+            return rng.choice(COMMON)
+        return ''.join(rng.choice(ONSETS) + rng.choice(VOWELS) + rng.choice(CODAS) for _ in range(rng.randint(2, 3)))
+
+    names = {}
+    appid = 10
+    while len(names) < count:
+        name = ' '.join(word() for _ in range(rng.randint(1, 4))).title() + rng.choice(SUFFIXES)
+        if rng.random() < 0.05:
+            name = name.replace('o', 'ö', 1)
+        names[appid] = name
+        appid += 10
+    return names
+
+
+def typo(word, rng):
+    i = rng.randrange(len(word))
+    return word[:i] + word[i + 1:] if rng.random() < 0.5 else word[:i] + rng.choice('aeiou') + word[i + 1:]
+
+
+def query_sets(names, count, seed=1):
+    """Return {query type: [queries]} drawn from the catalogue."""
+    rng = random.Random(seed)
+    sample = [normalize(name).split() for name in rng.sample(list(names.values()), count)]
+    long_words = [max(tokens, key=len) for tokens in sample]
+    return {
+        'exact name': [' '.join(tokens) for tokens in sample],
+        'single word': long_words,
+        'prefix (3 chars)': [word[:3] for word in long_words],
+        'infix (4 chars)': [word[1:5] for word in long_words if len(word) >= 6],
+        'typo': [typo(word, rng) for word in long_words if len(word) >= 6],
+        'two words': [' '.join(tokens[:2]) for tokens in sample if len(tokens) >= 2],
+        'common word': [rng.choice(COMMON) for _ in range(count)],
+    }
+
+
+def percentiles(fn, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[min(len(timings) - 1, int(0.99 * len(timings)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--names', type=int, default=50000)
+    parser.add_argument('--libraries', type=int, default=20, help='profiles sharing the catalogue in the cross-library test')
+    parser.add_argument('--queries', type=int, default=200, help='queries per type')
+    parser.add_argument('--limit', type=int, default=20, help='results returned per query')
+    args = parser.parse_args()
+
+    names = synthetic_names(args.names)
+    start = time.perf_counter()
+    index = NameIndex()
+    index.add_many(names.items())
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"{len(names)} names, {len(index.vocabulary)} distinct tokens, index build: {build_ms:.0f} ms")
+
+    lowered = {appid: name.lower() for appid, name in names.items()}
+
+    def linear_scan(query):
+        return [appid for appid, name in lowered.items() if query in name][:args.limit]
+
+    print(f"{'query type':<20}{'index p50':>11}{'index p99':>11}{'scan p50':>10}{'avg hits':>10}")
+    for label, queries in query_sets(names, args.queries).items():
+        p50, p99 = percentiles(lambda query: index.search(query, args.limit), queries)
+        scan_p50, _ = percentiles(linear_scan, queries[:20])
+        hits = sum(len(index.match(query)) for query in queries) / len(queries)
+        print(f"{label:<20}{p50:>9.3f}ms{p99:>9.3f}ms{scan_p50:>8.2f}ms{hits:>10.0f}")
+
+    # Every profile owns a random fifth of the catalogue
+    rng = random.Random(2)
+    appids = list(names)
+    libraries = {str(76561190000000000 + i): rng.sample(appids, len(appids) // 5) for i in range(args.libraries)}
+    search = LibrarySearch()
+    start = time.perf_counter()
+    for steam_id, owned in libraries.items():
+        search.update_library(steam_id, [{'appid': appid, 'name': names[appid]} for appid in owned])
+    for appid in appids:
+        search.set_metadata(appid, rng.sample(GENRES, 2))
+    load_ms = (time.perf_counter() - start) * 1000
+    print(f"\n{args.libraries} libraries of {len(appids) // 5} games, cross-library index load: {load_ms:.0f} ms")
+
+    queries = query_sets(names, args.queries)['single word']
+    friends = list(libraries)[:5]
+    for label, steam_ids in [('all libraries', None), ('5 profiles', friends)]:
+        p50, p99 = percentiles(lambda query: search.search(query, args.limit, steam_ids), queries)
+        print(f"{'search ' + label:<20}{p50:>9.3f}ms{p99:>9.3f}ms")
+
+    # A refresh where 1% of one library changed
+    steam_id, owned = next(iter(libraries.items()))
+    refreshed = owned[len(owned) // 100:] + rng.sample(appids, len(owned) // 100)
+    games = [{'appid': appid, 'name': names[appid]} for appid in refreshed]
+    start = time.perf_counter()
+    search.update_library(steam_id, games)
+    print(f"incremental refresh of one library ({len(games)} games, 1% changed): "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
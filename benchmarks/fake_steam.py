@@ -0,0 +1,176 @@
+"""Local stand-in for the Steam Web API and store API, for offline benchmarks.
+
+Usage: python benchmarks/fake_steam.py [--port 8765] [--latency 50] [--jitter 20] [--rate-limit 0.02]
+
+Serves ResolveVanityURL, GetOwnedGames, GetPlayerAchievements and the store's
+appdetails with synthetic data. Libraries are sized by the profile: the custom URL
+name ``bench<N>`` resolves to SteamID64 ``BASE_STEAM_ID + N``, which owns N games
+(e.g. bench10, bench1000, bench50000). Point the app at it with
+STEAM_API_BASE=http://127.0.0.1:8765 and STEAM_STORE_BASE=http://127.0.0.1:8765.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_library_query import synthetic_library  # noqa: E402
+
+BASE_STEAM_ID = 76561190000000000
+MAX_GAMES = 100000
+GENRES = ['Action', 'Adventure', 'RPG', 'Strategy', 'Simulation', 'Indie', 'Racing', 'Sports', 'Puzzle']
+CATEGORIES = ['Single-player', 'Multi-player', 'Co-op', 'Steam Achievements', 'Full controller support']
+
+
+def bench_steam_id(game_count):
+    return str(BASE_STEAM_ID + game_count)
+
+
+@lru_cache(maxsize=16)
+def owned_games_body(game_count):
+    """Serialised GetOwnedGames response, built once per library size."""
+    games = synthetic_library(game_count, seed=game_count)
+    for game in games:
+        game['img_icon_url'] = f'{game["appid"]:040x}'
+    return json.dumps({'response': {'game_count': len(games), 'games': games}}).encode()
+
+
+def app_details(appid):
+    rng = random.Random(appid)
+    if rng.random() < 0.03:
+        return {'success': False}
+    return {'success': True, 'data': {
+        'steam_appid': appid,
+        'genres': [{'description': genre} for genre in rng.sample(GENRES, rng.randint(1, 3))],
+        'categories': [{'description': category} for category in rng.sample(CATEGORIES, rng.randint(1, 3))],
+        'release_date': {'date': f'{rng.randint(1, 28)} Jan, {rng.randint(2004, 2025)}'},
+    }}
+
+
+def player_achievements(appid):
+    rng = random.Random(appid)
+    count = rng.choice([0, 0, 10, 25, 50, 100])
+    if not count:
+        return {'playerstats': {'error': 'Requested app has no stats', 'success': False}}
+    achievements = [{'apiname': f'ACH_{i}', 'achieved': int(rng.random() < 0.4), 'unlocktime': 0} for i in range(count)]
+    return {'playerstats': {'success': True, 'achievements': achievements}}
+
+
+class FakeSteamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=()):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        route = url.path.rstrip('/').split('/')
+        server.count(url.path)
+
+        delay = server.latency + random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+        if server.rate_limit and random.random() < server.rate_limit:
+            server.count('429')
+            return self.send_json(429, {'error': 'Too Many Requests'}, [('Retry-After', '1')])
+
+        if url.path == '/api/appdetails':
+            appid = params.get('appids', '')
+            if not appid.isdigit():
+                return self.send_json(400, {})
+            return self.send_json(200, {appid: app_details(int(appid))})
+        if len(route) < 3:
+            return self.send_json(404, {})
+        method = route[2]
+        if method == 'ResolveVanityURL':
+            name = params.get('vanityurl', '').lower()
+            count = name[len('bench'):]
+            if name.startswith('bench') and count.isdigit() and int(count) <= MAX_GAMES:
+                return self.send_json(200, {'response': {'success': 1, 'steamid': bench_steam_id(int(count))}})
+            return self.send_json(200, {'response': {'success': 42, 'message': 'No match'}})
+        if method == 'GetOwnedGames':
+            count = int(params.get('steamid', '0')) - BASE_STEAM_ID
+            if not 0 <= count <= MAX_GAMES:
+                return self.send_json(200, {'response': {}})
+            return self.send_json(200, owned_games_body(count))
+        if method == 'GetPlayerAchievements':
+            appid = params.get('appid', '')
+            if not appid.isdigit():
+                return self.send_json(400, {})
+            return self.send_json(200, player_achievements(int(appid)))
+        return self.send_json(404, {})
+
+
+class FakeSteamServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, rate_limit=0.0):
+        super().__init__(address, FakeSteamHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.counts = {}
+        self.counts_lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections at shutdown are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, key):
+        with self.counts_lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+
+def start_fake_steam(host='127.0.0.1', port=0, latency=0.0, jitter=0.0, rate_limit=0.0):
+    """Start a FakeSteamServer on a daemon thread and return it; port 0 picks a free port."""
+    server = FakeSteamServer((host, port), latency, jitter, rate_limit)
+    threading.Thread(target=server.serve_forever, name='fake-steam', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=50, help='base response latency in ms')
+    parser.add_argument('--jitter', type=float, default=20, help='extra random latency in ms')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='fraction of requests answered with 429')
+    args = parser.parse_args()
+
+    server = FakeSteamServer((args.host, args.port), args.latency / 1000, args.jitter / 1000, args.rate_limit)
+    print(f"Fake Steam API at {server.base_url} (latency {args.latency:.0f}+{args.jitter:.0f} ms, 429 rate {args.rate_limit:.0%})")
+    print(f"Profiles: bench<N> or SteamID {BASE_STEAM_ID}+N own N games (N <= {MAX_GAMES})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nRequests served: {server.counts}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Load-test the app's endpoints against the local fake Steam API.
+
+Usage: python benchmarks/load_test.py --spawn [--sizes 10,1000,50000] [--requests 50] [--concurrency 8]
+       python benchmarks/load_test.py --app-url http://127.0.0.1:5000 --user admin --password secret
+
+With --spawn, starts benchmarks/fake_steam.py in-process and the app (run.py
+--production) in a subprocess against a throwaway database, registers a bench
+user and tears everything down afterwards. Otherwise it drives an app that is
+already running with STEAM_API_BASE/STEAM_STORE_BASE pointing at fake_steam.py
+and RATELIMIT_ENABLED=false.
+
+For every library size and parameter mix it reports the first (cold) request,
+p50/p99 latency, requests per second and non-200 responses.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_steam import bench_steam_id, start_fake_steam  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (label, path, params); {name} is the bench<N> custom URL, {id} its SteamID64
+MIXES = [
+    ('library default', '/get_library', {'username': '{name}'}),
+    ('library playtime sort', '/get_library', {'username': '{name}', 'sortBy': 'playtime'}),
+    ('library filters', '/get_library', {'username': '{name}', 'showPlayedOnly': 'true', 'filterWindows': 'true',
+                                         'dateRange': 'lastYear', 'sortBy': 'lastPlayed'}),
+    ('library search', '/get_library', {'username': '{name}', 'search': 'souls'}),
+    ('library stats', '/library_stats', {'username': '{name}'}),
+    ('cross-library search', '/search', {'q': 'souls', 'ids': '{name}'}),
+    ('library by id', '/get_library_by_id', {'steamid': '{id}', 'sortBy': 'playtime2Weeks'}),
+    ('library + details', '/get_library', {'username': '{name}', 'sortBy': 'playtime', 'fetchDetails': 'true'}),
+    ('export csv', '/export_library', {'steamid': '{id}', 'format': 'csv'}),
+    ('achievements bulk', '/get_achievements_bulk', {'steamid': '{id}', 'appids': 'played'}),
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_mix(session, url, params, total, concurrency):
+    """Send total requests with concurrency in flight; return (first_ms, latencies_ms, wall_s, failures)."""
+    def one(_):
+        start = time.perf_counter()
+        response = session.get(url, params=params, timeout=120)
+        response.content  # drain streamed bodies (export) before stopping the clock
+        return (time.perf_counter() - start) * 1000, response.status_code
+
+    first_ms, first_status = one(None)
+    failures = {}
+    if first_status != 200:
+        failures[first_status] = 1
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    wall = time.perf_counter() - start
+    for _, status in results:
+        if status != 200:
+            failures[status] = failures.get(status, 0) + 1
+    return first_ms, sorted(ms for ms, _ in results), wall, failures
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def spawn_app(fake_url, workdir, threads):
+    """Start run.py --production against fake_url; return (process, app_url)."""
+    port = free_port()
+    env = dict(os.environ,
+               STEAM_API_KEY='bench', STEAM_API_BASE=fake_url, STEAM_STORE_BASE=fake_url,
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+               RATELIMIT_STORAGE_URI=f"sqlite:///{os.path.join(workdir, 'ratelimits.db')}",
+               RATELIMIT_ENABLED='false', FORCE_HTTPS='false', STORE_API_RATE='1000', WEB_API_RATE='1000')
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'run.py'), '--production', '--port', str(port),
+                                '--threads', str(threads)], cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    app_url = f'http://127.0.0.1:{port}'
+    wait_for(app_url)
+    return process, app_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--spawn', action='store_true', help='start the fake Steam API and the app automatically')
+    parser.add_argument('--app-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--user', default='bench')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--sizes', default='10,1000,50000', help='comma-separated library sizes')
+    parser.add_argument('--requests', type=int, default=50, help='requests per size and mix')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mix', action='append', help='only run mixes whose label contains this (repeatable)')
+    parser.add_argument('--latency', type=float, default=50, help='fake Steam latency in ms (with --spawn)')
+    parser.add_argument('--jitter', type=float, default=20, help='fake Steam extra random latency in ms (with --spawn)')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='fraction of fake Steam responses that are 429 (with --spawn)')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    mixes = [mix for mix in MIXES if not args.mix or any(word in mix[0] for word in args.mix)]
+    process = None
+    workdir = tempfile.TemporaryDirectory()
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+    try:
+        app_url = args.app_url
+        if args.spawn:
+            fake = start_fake_steam(latency=args.latency / 1000, jitter=args.jitter / 1000, rate_limit=args.rate_limit)
+            process, app_url = spawn_app(fake.base_url, workdir.name, max(8, args.concurrency * 2))
+            session.post(f'{app_url}/register', json={'username': args.user, 'password': args.password})
+            print(f"Fake Steam API at {fake.base_url}, app at {app_url}")
+        session.auth = (args.user, args.password)
+
+        print(f"{args.requests} requests per row, {args.concurrency} concurrent")
+        print(f"{'games':>6}  {'parameter mix':<24}{'first ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}  errors")
+        for size in sizes:
+            for label, path, params in mixes:
+                params = {key: value.format(name=f'bench{size}', id=bench_steam_id(size)) for key, value in params.items()}
+                first_ms, latencies, wall, failures = run_mix(session, app_url + path, params, args.requests, args.concurrency)
+                errors = ', '.join(f'{status}x{count}' for status, count in sorted(failures.items())) or '-'
+                print(f"{size:>6}  {label:<24}{first_ms:>10.1f}{percentile(latencies, 0.5):>10.1f}"
+                      f"{percentile(latencies, 0.99):>10.1f}{len(latencies) / wall:>10.1f}  {errors}")
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=10)
+        workdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,391 @@
+"""Precomputed filter/sort index over an owned-games list, shared by the library endpoints.
+
+A LibraryIndex is built once per cached library. It keeps columnar arrays of the
+fields the endpoints filter on plus one pre-sorted permutation per sortBy option,
+so any filter combination is answered by walking the requested order once per
+active filter, without sorting.
+
+ViewSnapshots pins the result of one query so it can be paged through with
+opaque cursors while the underlying library is refetched.
+"""
+import base64
+import json
+import secrets
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from search_index import NameIndex
+
+SORT_OPTIONS = ('name', 'playtime', 'lastPlayed', 'playtime2Weeks', 'relevance')
+DATE_RANGES = {'all': None, 'last30Days': 30 * 24 * 60 * 60, 'lastYear': 365 * 24 * 60 * 60}
+SEARCH_CACHE_SIZE = 32
+RECENT_WINDOW = 31 * 24 * 60 * 60  # games last played within this many seconds count as recent
+DAY = 24 * 60 * 60
+RECENT_FALLBACK = 10  # most recently played games shown when none are recent
+# Approximate resident bytes per game (dicts plus columns, and the name index once built),
+# measured on synthetic libraries; used for memory budgets
+GAME_BYTES = 800
+NAME_INDEX_GAME_BYTES = 1500
+
+# Bit flags stored per game in LibraryIndex.flags
+PLAYED = 1
+WINDOWS = 2
+MAC = 4
+LINUX = 8
+DECK = 16
+
+PLATFORM_FIELDS = (
+    (PLAYED, 'playtime_forever'),
+    (WINDOWS, 'playtime_windows_forever'),
+    (MAC, 'playtime_mac_forever'),
+    (LINUX, 'playtime_linux_forever'),
+    (DECK, 'playtime_deck_forever'),
+)
+PLATFORM_NAMES = (('windows', 'playtime_windows_forever'), ('mac', 'playtime_mac_forever'),
+                  ('linux', 'playtime_linux_forever'), ('deck', 'playtime_deck_forever'))
+
+
+def is_valid_game(game):
+    return isinstance(game, dict) and 'appid' in game and 'name' in game
+
+
+class LibraryIndex:
+    def __init__(self, games, fetched_at=None, name_search=None):
+        self.games = [game for game in games if is_valid_game(game)]
+        self.fetched_at = fetched_at
+        self.by_appid = {game['appid']: i for i, game in enumerate(self.games)}
+        self.names = [game.get('name', '').lower() for game in self.games]
+        # name_search(search, ranked) answers name searches from an index kept elsewhere (the
+        # app's LibrarySearch) as a set or ranked list of appids, or None when it can't. Without
+        # it a NameIndex over this library is built on the first search. Recent matches are
+        # memoised so paging through one search result reuses them.
+        self.name_search = name_search
+        self.name_index = None
+        self.search_cache = {}
+        # stats() results per top_n; the index is rebuilt whenever the library is refetched
+        self.stats_cache = {}
+        self.playtime = array('q', (game.get('playtime_forever', 0) or 0 for game in self.games))
+        self.playtime_2weeks = array('q', (game.get('playtime_2weeks', 0) or 0 for game in self.games))
+        self.last_played = array('q', (game.get('rtime_last_played', 0) or 0 for game in self.games))
+        self.flags = bytearray(
+            sum(flag for flag, field in PLATFORM_FIELDS if (game.get(field, 0) or 0) > 0) for game in self.games
+        )
+        # Stable sorts over the full list, so filtering a permutation gives the same
+        # order as sorting the filtered list
+        positions = range(len(self.games))
+        self.order = {
+            'name': array('l', sorted(positions, key=self.names.__getitem__)),
+            'playtime': array('l', sorted(positions, key=self.playtime.__getitem__, reverse=True)),
+            'lastPlayed': array('l', sorted(positions, key=self.last_played.__getitem__, reverse=True)),
+            'playtime2Weeks': array('l', sorted(positions, key=self.playtime_2weeks.__getitem__, reverse=True)),
+        }
+
+    def __len__(self):
+        return len(self.games)
+
+    def estimated_bytes(self):
+        per_game = GAME_BYTES + (NAME_INDEX_GAME_BYTES if self.name_index is not None else 0)
+        return len(self.games) * per_game
+
+    def search_positions(self, search, ranked=False):
+        """Return the set of positions whose name matches search, or with ranked, a list best match first.
+
+        Matching is token-based with prefix, infix and typo tolerance; see search_index.
+        """
+        key = (search, ranked)
+        matched = self.search_cache.get(key)
+        if matched is not None:
+            return matched
+        if self.name_search is not None:
+            appids = self.name_search(search, ranked)
+            if appids is not None:
+                by_appid = self.by_appid
+                if ranked:
+                    matched = [by_appid[appid] for appid in appids if appid in by_appid]
+                else:
+                    matched = {by_appid[appid] for appid in appids if appid in by_appid}
+        if matched is None:
+            if self.name_index is None:
+                name_index = NameIndex()
+                name_index.add_many((i, game['name']) for i, game in enumerate(self.games))
+                self.name_index = name_index
+            if ranked:
+                matched = [i for i, _ in self.name_index.search(search)]
+            else:
+                matched = set(self.name_index.match(search))
+        if len(self.search_cache) >= SEARCH_CACHE_SIZE:
+            self.search_cache.clear()
+        self.search_cache[key] = matched
+        return matched
+
+    def query(self, flags=0, search='', date_range='all', sort_by='name', now=None):
+        """Return positions of games matching every filter, in sort_by order.
+
+        flags is an OR of PLAYED/WINDOWS/MAC/LINUX/DECK that a game must all have.
+        Each filter only walks the candidates left by the previous one, and the
+        pre-sorted order is preserved throughout, so nothing is re-sorted. The relevance
+        order ranks search matches and falls back to name order without a search.
+        """
+        candidates = self.order['name' if sort_by == 'relevance' else sort_by]
+        if search and sort_by == 'relevance':
+            candidates = self.search_positions(search, ranked=True)
+        elif search:
+            matched = self.search_positions(search)
+            candidates = [i for i in candidates if i in matched] if matched else []
+        if flags:
+            game_flags = self.flags
+            candidates = [i for i in candidates if game_flags[i] & flags == flags]
+        window = DATE_RANGES[date_range]
+        if window is not None:
+            cutoff = int(now if now is not None else time.time()) - window
+            last_played = self.last_played
+            candidates = [i for i in candidates if last_played[i] >= cutoff]
+        return candidates
+
+    def page(self, positions, start, end):
+        """Copy the games at positions[start:end] so callers can annotate them freely."""
+        return [dict(self.games[i]) for i in positions[start:end]]
+
+    def stats(self, top_n=20, now=None):
+        """Aggregate the library for the stats card, the playtime chart and the top/recent lists.
+
+        Totals, per-platform playtime, the per-month last-played histogram (UTC) and the
+        recent games are gathered in one pass; the top lists are prefixes of the
+        pre-sorted orders. Playtimes are in minutes, as Steam reports them. The recent window
+        is measured from the start of the current UTC day, so results (and the ETags derived
+        from recent_day) only change when the day does.
+        """
+        day = recent_day(now)
+        cached = self.stats_cache.get((top_n, day))
+        if cached is not None:
+            return cached
+
+        cutoff = day * DAY - RECENT_WINDOW
+        total_playtime = 0
+        games_played = 0
+        platform_playtime = {name: 0 for name, _ in PLATFORM_NAMES}
+        months = {}
+        day_months = {}  # formatting a date is the slow part, so it is done once per day
+        recent = []
+        for i, game in enumerate(self.games):
+            playtime = self.playtime[i]
+            total_playtime += playtime
+            if playtime > 0:
+                games_played += 1
+            for name, field in PLATFORM_NAMES:
+                platform_playtime[name] += game.get(field, 0) or 0
+            last_played = self.last_played[i]
+            if last_played:
+                played_day = last_played // DAY
+                month = day_months.get(played_day)
+                if month is None:
+                    month = day_months[played_day] = time.strftime('%Y-%m', time.gmtime(last_played))
+                bucket = months.get(month)
+                if bucket is None:
+                    bucket = months[month] = {'month': month, 'games': 0, 'playtime': 0}
+                bucket['games'] += 1
+                bucket['playtime'] += playtime
+            if self.playtime_2weeks[i] > 0 or (last_played and last_played >= cutoff):
+                recent.append(i)
+
+        recent.sort(key=lambda i: -self.last_played[i])
+        if not recent:
+            recent = [i for i in self.order['lastPlayed'][:RECENT_FALLBACK] if self.last_played[i]]
+        by_2weeks = self.order['playtime2Weeks']
+        top_2weeks = []
+        for i in by_2weeks[:top_n]:
+            if self.playtime_2weeks[i] <= 0:
+                break
+            top_2weeks.append(i)
+
+        stats = {
+            'total_games': len(self.games),
+            'games_played': games_played,
+            'total_playtime': total_playtime,
+            'average_playtime': total_playtime // games_played if games_played else 0,
+            'max_playtime': self.playtime[self.order['playtime'][0]] if self.games else 0,
+            'platform_playtime': platform_playtime,
+            'most_active_platform': max(platform_playtime, key=platform_playtime.get),
+            'last_played_months': [months[month] for month in sorted(months)],
+            'top_playtime': self.page(self.order['playtime'], 0, top_n),
+            'top_playtime_2weeks': self.page(top_2weeks, 0, top_n),
+            'recent': self.page(recent, 0, len(recent)),
+        }
+        self.stats_cache[(top_n, day)] = stats
+        return stats
+
+
+def recent_day(now=None):
+    """UTC day number that LibraryIndex.stats measures the recent window from."""
+    return int(now if now is not None else time.time()) // DAY
+
+
+class ViewSnapshot:
+    def __init__(self, snapshot_id, key, index, positions, taken_at, now):
+        self.id = snapshot_id
+        self.key = key
+        self.index = index
+        self.positions = positions
+        self.taken_at = taken_at
+        self.last_used = now
+
+    @property
+    def size(self):
+        return len(self.positions) * self.positions.itemsize
+
+
+class ViewSnapshots:
+    """Short-lived snapshots of filtered, sorted library views, addressed by cursors.
+
+    A snapshot pins the LibraryIndex it was taken from plus the matching positions,
+    so every later page is an O(page size) slice that doesn't shift when playtime
+    changes or the library is refetched. Asking for the same view again returns
+    the live snapshot. Snapshots unused for ttl seconds expire, and the least
+    recently used are evicted once their position arrays plus the indexes they pin
+    (each counted once, however many snapshots share it) exceed max_bytes.
+    """
+
+    def __init__(self, ttl, max_bytes):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.snapshots = OrderedDict()  # id -> ViewSnapshot, least recently used first
+        self.by_key = {}
+        self.pinned = {}  # id(LibraryIndex) -> [estimated bytes, snapshots pinning it]
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, snapshot_id, now=None):
+        now = now if now is not None else time.time()
+        with self.lock:
+            self.evict(now)
+            snapshot = self.snapshots.get(snapshot_id)
+            if snapshot is not None:
+                snapshot.last_used = now
+                self.snapshots.move_to_end(snapshot_id)
+            return snapshot
+
+    def snapshot(self, key, index, positions, taken_at=None, now=None):
+        """Return the live snapshot for key, or take one of positions over index.
+
+        taken_at is the time the positions were computed for (it matters to date ranges).
+        """
+        now = now if now is not None else time.time()
+        with self.lock:
+            self.evict(now)
+            snapshot_id = self.by_key.get(key)
+            if snapshot_id is not None:
+                snapshot = self.snapshots[snapshot_id]
+                snapshot.last_used = now
+                self.snapshots.move_to_end(snapshot_id)
+                return snapshot
+            snapshot = ViewSnapshot(secrets.token_urlsafe(12), key, index, array('l', positions),
+                                    taken_at if taken_at is not None else now, now)
+            self.snapshots[snapshot.id] = snapshot
+            self.by_key[key] = snapshot.id
+            self.total_bytes += snapshot.size
+            pin = self.pinned.get(id(index))
+            if pin is None:
+                pin = self.pinned[id(index)] = [index.estimated_bytes(), 0]
+                self.total_bytes += pin[0]
+            pin[1] += 1
+            self.evict(now, keep=snapshot.id)
+            return snapshot
+
+    def evict(self, now, keep=None):
+        # Callers hold self.lock
+        while self.snapshots:
+            snapshot = next(iter(self.snapshots.values()))
+            expired = now - snapshot.last_used >= self.ttl
+            if snapshot.id == keep or not (expired or self.total_bytes > self.max_bytes):
+                break
+            del self.snapshots[snapshot.id]
+            del self.by_key[snapshot.key]
+            self.total_bytes -= snapshot.size
+            pin = self.pinned[id(snapshot.index)]
+            pin[1] -= 1
+            if not pin[1]:
+                del self.pinned[id(snapshot.index)]
+                self.total_bytes -= pin[0]
+
+    def stats(self):
+        with self.lock:
+            return {'snapshots': len(self.snapshots), 'indexes': len(self.pinned), 'bytes': self.total_bytes}
+
+
+def encode_cursor(snapshot_id, offset, view):
+    """Encode a cursor; view is the list of arguments needed to rebuild the snapshot if it is gone."""
+    payload = json.dumps([snapshot_id, offset, view], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (snapshot_id, offset, view) for a cursor from encode_cursor, or None if it is malformed."""
+    try:
+        snapshot_id, offset, view = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(snapshot_id, str) or not isinstance(offset, int) or offset < 0 or not isinstance(view, list):
+        return None
+    return snapshot_id, offset, view
+
+
+def compare_indexes(steam_ids, indexes, start, end):
+    """Diff several libraries by appid and return counts plus [start:end] slices of each list.
+
+    common holds games every profile owns with each owner's playtime, sorted by combined
+    playtime; unique holds, per profile, games nobody else in the group owns.
+    """
+    appid_sets = [set(index.by_appid) for index in indexes]
+    common = set.intersection(*appid_sets)
+    owner_counts = {}
+    for appids in appid_sets:
+        for appid in appids:
+            owner_counts[appid] = owner_counts.get(appid, 0) + 1
+    histogram = {}
+    for count in owner_counts.values():
+        histogram[count] = histogram.get(count, 0) + 1
+
+    def game_at(index, appid):
+        return index.games[index.by_appid[appid]]
+
+    common_games = []
+    for appid in common:
+        playtime = {steam_id: game_at(index, appid).get('playtime_forever', 0) or 0 for steam_id, index in zip(steam_ids, indexes)}
+        common_games.append({'appid': appid, 'name': game_at(indexes[0], appid)['name'], 'playtime': playtime})
+    common_games.sort(key=lambda game: (-sum(game['playtime'].values()), game['name'].lower()))
+
+    unique = {}
+    for steam_id, index, appids in zip(steam_ids, indexes, appid_sets):
+        only_mine = [appid for appid in appids if owner_counts[appid] == 1]
+        games = [{'appid': appid, 'name': game_at(index, appid)['name'],
+                  'playtime_forever': game_at(index, appid).get('playtime_forever', 0) or 0} for appid in only_mine]
+        games.sort(key=lambda game: (-game['playtime_forever'], game['name'].lower()))
+        unique[steam_id] = {'total': len(games), 'games': games[start:end]}
+
+    profiles = []
+    for steam_id, index in zip(steam_ids, indexes):
+        profiles.append({
+            'steam_id': steam_id,
+            'game_count': len(index),
+            'total_playtime': sum(index.playtime),
+            'common_playtime': sum(game['playtime'][steam_id] for game in common_games)
+        })
+
+    return {
+        'profiles': profiles,
+        'owner_histogram': {str(count): histogram[count] for count in sorted(histogram)},
+        'common': {'total': len(common_games), 'games': common_games[start:end]},
+        'unique': unique
+    }
+
+
+def flags_from_args(args):
+    """Build query() flags from the showPlayedOnly/filter* request arguments."""
+    flags = 0
+    for flag, name in ((PLAYED, 'showPlayedOnly'), (WINDOWS, 'filterWindows'), (MAC, 'filterMac'),
+                       (LINUX, 'filterLinux'), (DECK, 'filterDeck')):
+        if args.get(name, 'false').lower() == 'true':
+            flags |= flag
+    return flags
@@ -0,0 +1,83 @@
+"""SQLite-backed storage for Flask-Limiter, so several server processes share one set of counters.
+
+Importing this module registers the ``sqlite://`` scheme with the limits library:
+``sqlite:///ratelimits.db`` is relative to the working directory and
+``sqlite:////var/lib/app/ratelimits.db`` is absolute. Only the fixed-window
+strategy (Flask-Limiter's default) is supported.
+"""
+import random
+import sqlite3
+import threading
+import time
+
+from limits.storage import Storage
+
+
+class SQLiteStorage(Storage):
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        path = uri.split("://", 1)[1]
+        self.path = path[1:] if path.startswith("/") else path
+        self.local = threading.local()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        with self.connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS ratelimit (key TEXT PRIMARY KEY, value INTEGER NOT NULL, expiry REAL NOT NULL)")
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def connection(self):
+        """Return this thread's connection; sqlite3 connections can't be shared between threads."""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO ratelimit (key, value, expiry) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET "
+                "value = CASE WHEN expiry <= ? THEN excluded.value ELSE value + excluded.value END, "
+                "expiry = CASE WHEN expiry <= ? THEN excluded.expiry ELSE expiry END",
+                (key, amount, now + expiry, now, now)
+            )
+            value = conn.execute("SELECT value FROM ratelimit WHERE key = ?", (key,)).fetchone()[0]
+            # Occasionally sweep expired windows so the table stays small
+            if random.random() < 0.01:
+                conn.execute("DELETE FROM ratelimit WHERE expiry <= ?", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def get(self, key):
+        row = self.connection().execute(
+            "SELECT value FROM ratelimit WHERE key = ? AND expiry > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self.connection().execute("SELECT expiry FROM ratelimit WHERE key = ?", (key,)).fetchone()
+        return row[0] if row and row[0] > time.time() else time.time()
+
+    def check(self):
+        try:
+            self.connection().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self.connection().execute("DELETE FROM ratelimit").rowcount
+
+    def clear(self, key):
+        self.connection().execute("DELETE FROM ratelimit WHERE key = ?", (key,))
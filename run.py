@@ -1,19 +1,51 @@
+import argparse
 import signal
 import sys
 import os
-from app import app
 
 def signal_handler(sig, frame):
     print("\nServer stopped.")
     sys.exit(0)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Start the Steam Library Fetcher server.")
+    parser.add_argument('--production', action='store_true',
+                        default=os.environ.get("APP_ENV", "").lower() == "production",
+                        help="Serve with waitress instead of the Flask debug server (or set APP_ENV=production)")
+    parser.add_argument('--threads', type=int,
+                        default=int(os.environ.get("WAITRESS_THREADS", max(8, (os.cpu_count() or 1) * 4))),
+                        help="Worker threads in production mode (or set WAITRESS_THREADS)")
+    parser.add_argument('--host', default=os.environ.get("HOST", '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get("PORT", 5000)))
+    return parser.parse_args()
+
 if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal_handler)
-    host = '127.0.0.1'
-    port = int(os.environ.get("PORT", 5000))
-    url = f"http://{host}:{port}"
-    
-    print(f"Starting Flask development server...")
-    print(f"Server is running at: {url}")
-    print(f"Access it in your browser. Press Ctrl+C to stop.")
-    app.run(debug=True, host=host, port=port)
\ No newline at end of file
+    args = parse_args()
+    url = f"http://{args.host}:{args.port}"
+
+    if args.production:
+        # Rate-limit counters live in a local SQLite file so every server process shares them;
+        # must be set before app is imported
+        os.environ.setdefault("RATELIMIT_STORAGE_URI", "sqlite:///ratelimits.db")
+        from waitress import serve
+        from app import app, start_background
+
+        start_background()
+
+        print(f"Starting production server (waitress, {args.threads} threads)...")
+        print(f"Server is running at: {url}")
+        print(f"Access it in your browser. Press Ctrl+C to stop.")
+        serve(app, host=args.host, port=args.port, threads=args.threads)
+    else:
+        from app import app, start_background
+
+        # The debug reloader re-runs this script in a child process that serves the requests;
+        # the watching parent must not take the background lock
+        if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            start_background()
+
+        print(f"Starting Flask development server...")
+        print(f"Server is running at: {url}")
+        print(f"Access it in your browser. Press Ctrl+C to stop.")
+        app.run(debug=True, host=args.host, port=args.port)
@@ -0,0 +1,476 @@
+"""Ranked game-name search with normalised tokens, prefix/infix matching and typo tolerance.
+
+NameIndex maps document ids to names (plus optional metadata terms such as
+genres). Names are normalised so case, accents, trademark signs and punctuation
+don't matter ("The Witcher® 3" matches "witcher 3"). Every query token must
+match a document, either exactly, as a prefix or infix of a name token, or, if
+nothing else matches, through trigram similarity ("witchr" finds "witcher").
+The trigram and prefix structures are built over the vocabulary, not the
+documents, so a lookup touches only the postings of the tokens it matches.
+A query with no letters or digits at all ("++", "!") has no tokens; it falls
+back to a substring scan of the names containing symbols.
+
+LibrarySearch keeps one NameIndex over every app in the cached libraries, plus
+which profiles own each app, for cross-library questions like "which of my
+friends own X". The app also answers each library's own search filter from it,
+restricted to that library's appids, so no per-library index is built.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from itertools import islice
+from operator import itemgetter
+
+# Weights for how a query token matched a name token; metadata matches count half
+EXACT = 1.0
+PREFIX = 0.9
+INFIX = 0.75
+FUZZY = 0.7
+METADATA = 0.5
+FUZZY_MIN_SIMILARITY = 0.25
+FUZZY_MIN_SHARED = 0.5  # fraction of the query's trigrams a fuzzy candidate must share
+FUZZY_MAX_CANDIDATES = 2000  # name tokens whose trigram overlap is counted for one query token
+FUZZY_MAX_EDITS = 2  # typos tolerated in a query token of 6+ characters; shorter ones allow 1
+MAX_EXPANSIONS = 200  # name tokens a single query token may expand to
+CHECK_CANDIDATES = 1000  # below this many candidates, later query tokens are checked per document
+
+NON_WORD = re.compile(r'[\W_]+')
+SYMBOL = re.compile(r'[^\w\s]|_')
+
+
+def normalize(text):
+    """Lower-case, strip accents and replace everything but letters and digits with single spaces."""
+    if text.isascii():
+        return NON_WORD.sub(' ', text.lower()).strip()
+    # Symbols such as ™ go before NFKD, which would spell them out as letters
+    text = ''.join(' ' if unicodedata.category(char)[0] == 'S' else char for char in text)
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return NON_WORD.sub(' ', text.casefold()).strip()
+
+
+def tokenize(text):
+    return normalize(text).split()
+
+
+def trigrams(token):
+    padded = f' {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """Token and trigram index over document names; doc ids are ints (appids or list positions).
+
+    Matches are kept as sets of doc ids grouped by score, so intersecting query
+    tokens and picking the best results are set operations rather than per-document
+    Python loops.
+    """
+
+    def __init__(self):
+        self.names = {}  # doc id -> normalised name
+        self.lengths = {}  # doc id -> length of the normalised name, the ranking tie-break
+        self.doc_tokens = {}  # doc id -> tuple of name tokens
+        self.doc_metadata = {}  # doc id -> tuple of metadata tokens, for documents that have any
+        self.postings = {}  # name token -> set of doc ids
+        self.meta_postings = {}  # metadata token -> set of doc ids
+        self.vocabulary = []  # sorted name tokens, for prefix ranges
+        self.token_trigrams = {}  # trigram -> set of name tokens
+        self.sorted_names = []  # sorted (normalised name, doc id), for whole-name prefix ranges
+        self.length_order = None  # doc ids, shortest name first; rebuilt on demand after changes
+        self.symbol_names = {}  # doc id -> case-folded name, for names with characters normalize drops
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.names
+
+    def add_many(self, documents, metadata=None):
+        """Index (doc id, name) pairs, sorting the vocabulary once at the end.
+
+        metadata, if given, maps doc ids to their metadata terms. A small batch into a
+        large index is inserted in place instead, which is cheaper than re-sorting.
+        """
+        documents = dict(documents)
+        keep_sorted = len(documents) * 100 < len(self.names)
+        for doc_id in documents:
+            self.remove(doc_id)
+        for doc_id, name in documents.items():
+            self.add(doc_id, name, metadata.get(doc_id, ()) if metadata else (), keep_sorted)
+        if not keep_sorted:
+            self.vocabulary.sort()
+            self.sorted_names.sort()
+
+    def add(self, doc_id, name, metadata=(), keep_sorted=True):
+        """Index (or re-index) a document.
+
+        With keep_sorted False the sorted lists are only appended to; the caller must
+        sort them before the next lookup or removal (see add_many).
+        """
+        if doc_id in self.names:
+            self.remove(doc_id)
+        normalized = normalize(name)
+        tokens = tuple(dict.fromkeys(normalized.split()))
+        self.names[doc_id] = normalized
+        self.lengths[doc_id] = len(normalized)
+        self.length_order = None
+        self.doc_tokens[doc_id] = tokens
+        if SYMBOL.search(name):
+            self.symbol_names[doc_id] = name.casefold()
+        self.insert(self.sorted_names, (normalized, doc_id), keep_sorted)
+        for token in tokens:
+            docs = self.postings.get(token)
+            if docs is None:
+                docs = self.postings[token] = set()
+                self.insert(self.vocabulary, token, keep_sorted)
+                for trigram in trigrams(token):
+                    self.token_trigrams.setdefault(trigram, set()).add(token)
+            docs.add(doc_id)
+        self.set_metadata(doc_id, metadata)
+
+    @staticmethod
+    def insert(values, value, keep_sorted):
+        if keep_sorted:
+            bisect.insort(values, value)
+        else:
+            values.append(value)
+
+    def set_metadata(self, doc_id, metadata):
+        if doc_id not in self.names:
+            return
+        for token in self.doc_metadata.pop(doc_id, ()):
+            self.discard(self.meta_postings, token, doc_id)
+        meta_tokens = tuple(dict.fromkeys(token for term in metadata for token in tokenize(term)))
+        if meta_tokens:
+            self.doc_metadata[doc_id] = meta_tokens
+        for token in meta_tokens:
+            self.meta_postings.setdefault(token, set()).add(doc_id)
+
+    def remove(self, doc_id):
+        if doc_id not in self.names:
+            return
+        tokens = self.doc_tokens.pop(doc_id)
+        normalized = self.names.pop(doc_id)
+        del self.lengths[doc_id]
+        self.length_order = None
+        self.symbol_names.pop(doc_id, None)
+        del self.sorted_names[bisect.bisect_left(self.sorted_names, (normalized, doc_id))]
+        for token in tokens:
+            if self.discard(self.postings, token, doc_id):
+                # Last document using this token; drop it from the vocabulary structures
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+                for trigram in trigrams(token):
+                    self.discard(self.token_trigrams, trigram, token)
+        for token in self.doc_metadata.pop(doc_id, ()):
+            self.discard(self.meta_postings, token, doc_id)
+
+    @staticmethod
+    def discard(postings, key, value):
+        """Remove value from postings[key]; return True if that emptied and removed the key."""
+        values = postings.get(key)
+        if values is None:
+            return False
+        values.discard(value)
+        if not values:
+            del postings[key]
+            return True
+        return False
+
+    def expand(self, query_token):
+        """Return [(weight, name tokens)] for the vocabulary a query token matches, best weight first.
+
+        Prefix matches are complete; infix and fuzzy matches stop at MAX_EXPANSIONS tokens.
+        Single characters only match as a whole token or prefix.
+        """
+        start = bisect.bisect_left(self.vocabulary, query_token)
+        end = bisect.bisect_left(self.vocabulary, query_token + '\U0010ffff', start)
+        expansions = []
+        if query_token in self.postings:
+            expansions.append((EXACT, [query_token]))
+            start += 1
+        if end > start:
+            expansions.append((PREFIX, self.vocabulary[start:end]))
+        if len(query_token) >= 3:
+            # Tokens containing every inner trigram of the query are infix candidates
+            inner = sorted((self.token_trigrams.get(query_token[i:i + 3], set())
+                            for i in range(len(query_token) - 2)), key=len)
+            candidates = set.intersection(*inner) if inner[0] else ()
+        elif len(query_token) == 2:
+            # Too short for an inner trigram; tokens with a trigram containing it are the candidates
+            candidates = set().union(*(tokens for trigram, tokens in self.token_trigrams.items() if query_token in trigram))
+        else:
+            candidates = ()
+        infix = []
+        for token in candidates:
+            if query_token in token and not token.startswith(query_token):
+                infix.append(token)
+                if len(infix) >= MAX_EXPANSIONS:
+                    break
+        if infix:
+            expansions.append((INFIX, infix))
+        if not expansions and len(query_token) >= 3:
+            expansions = self.fuzzy(query_token)
+        return expansions
+
+    def fuzzy(self, query_token):
+        """Return [(weight, name tokens)] for tokens whose trigram similarity to query_token is high enough."""
+        query_trigrams = sorted(trigrams(query_token), key=lambda trigram: len(self.token_trigrams.get(trigram, ())))
+        # Each typo changes at most 3 trigrams, so a token within the allowed typos shares at
+        # least min_count of them and contains one of the len - min_count + 1 rarest; only
+        # those tokens are counted. Requiring FUZZY_MIN_SHARED of them as well keeps two
+        # typos in a short token from drawing in most of the vocabulary.
+        edits = FUZZY_MAX_EDITS if len(query_token) >= 6 else 1
+        min_count = max(math.ceil(FUZZY_MIN_SHARED * len(query_trigrams)), len(query_trigrams) - 3 * edits)
+        # Counting is the slow part, so when the rarest trigrams are still common, fewer of
+        # them are used (demanding a larger overlap) until at most FUZZY_MAX_CANDIDATES remain
+        sources = []
+        size = 0
+        for trigram in query_trigrams[:len(query_trigrams) - min_count + 1]:
+            tokens = self.token_trigrams.get(trigram, ())
+            size += len(tokens)
+            if sources and size > FUZZY_MAX_CANDIDATES:
+                break
+            sources.append(tokens)
+        min_count = len(query_trigrams) - len(sources) + 1
+        candidates = set().union(*sources)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self.token_trigrams.get(trigram, set()) & candidates)
+        by_weight = {}
+        for token, count in shared.items():
+            if count < max(min_count, len(token) - 3 * edits):
+                continue
+            # A token of length n has n trigrams, fewer if some repeat
+            similarity = count / (len(query_trigrams) + len(token) - count)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                by_weight.setdefault(round(FUZZY * similarity, 2), []).append(token)
+        expansions = []
+        for weight in sorted(by_weight, reverse=True):
+            expansions.append((weight, by_weight[weight]))
+            if sum(len(tokens) for _, tokens in expansions) >= MAX_EXPANSIONS:
+                break
+        return expansions
+
+    def token_groups(self, query_token, within=None):
+        """Return [(weight, doc ids)] for one query token; each document is in the group of its best weight.
+
+        within, if given, is the set of doc ids still in the running. When it is small each
+        of those documents is checked directly instead of merging the postings of every
+        matching token.
+        """
+        check = within is not None and len(within) <= CHECK_CANDIDATES
+        groups = []
+        seen = set()
+        # Sets from the postings are shared, not copied, so nothing here may modify them in place
+        for weight, tokens in self.expand(query_token):
+            if check:
+                tokens = set(tokens)
+                docs = {doc_id for doc_id in within if not tokens.isdisjoint(self.doc_tokens[doc_id])}
+            elif len(tokens) == 1:
+                docs = self.postings[tokens[0]]
+            else:
+                docs = set().union(*map(self.postings.__getitem__, tokens))
+            if within is not None and not check:
+                docs = docs & within
+            if seen:
+                docs = docs - seen
+            if docs:
+                groups.append((weight, docs))
+                seen = seen | docs if seen else docs
+        docs = self.meta_postings.get(query_token, set())
+        if within is not None:
+            docs = docs & within
+        if seen:
+            docs = docs - seen
+        if docs:
+            groups.append((METADATA, docs))
+        return groups
+
+    def scored_groups(self, query):
+        """Return [(score, doc ids)] for documents matching every query token, unranked."""
+        query_tokens = set(tokenize(query))
+        if not query_tokens:
+            return self.symbol_groups(query)
+        groups = []
+        # Longer tokens tend to match fewer documents, so they narrow the candidates first
+        for n, query_token in enumerate(sorted(query_tokens, key=len, reverse=True)):
+            if not n:
+                groups = self.token_groups(query_token)
+            else:
+                token_groups = self.token_groups(query_token, set().union(*(docs for _, docs in groups)))
+                combined = {}
+                for score, docs in groups:
+                    for weight, matched in token_groups:
+                        both = docs & matched
+                        if both:
+                            key = round(score + weight, 2)
+                            combined[key] = combined[key] | both if key in combined else both
+                groups = list(combined.items())
+            if not groups:
+                break
+        return groups
+
+    def symbol_groups(self, query):
+        """Return [(score, doc ids)] for names containing a query that is only symbols, e.g. "++"."""
+        needle = query.strip().casefold()
+        if not needle:
+            return []
+        docs = {doc_id for doc_id, name in self.symbol_names.items() if needle in name}
+        return [(INFIX, docs)] if docs else []
+
+    def match(self, query):
+        """Return the set of doc ids matching every query token."""
+        return set().union(*(docs for _, docs in self.scored_groups(query)))
+
+    def rank(self, query, groups, limit=None):
+        """Order scored groups into [(doc id, score)], best first, keeping at most limit.
+
+        Names equal to the query phrase score 1 more and names starting with it 0.5 more;
+        within a score, shorter names come first.
+        """
+        phrase = ' '.join(dict.fromkeys(tokenize(query)))
+        if not phrase:
+            # A symbol query; every name would "start with" the empty phrase
+            return [(doc_id, score) for score, docs in sorted(groups, key=itemgetter(0), reverse=True)
+                    for doc_id in self.shortest(docs, count=limit)][:limit]
+        start = bisect.bisect_left(self.sorted_names, (phrase,))
+        end = bisect.bisect_left(self.sorted_names, (phrase + '\U0010ffff',), start)
+        exact_end = bisect.bisect_left(self.sorted_names, (phrase + '\0',), start, end)
+        prefixed = set(map(itemgetter(1), self.sorted_names[start:end]))
+        exact = set(map(itemgetter(1), self.sorted_names[start:exact_end]))
+
+        # Score -> [(doc ids, doc ids to leave out)]; documents that earned a bonus move up a tier
+        tiers = {}
+        for score, docs in groups:
+            starts = docs & prefixed
+            if starts:
+                whole = starts & exact
+                for bonus, subset in ((1.0, whole), (0.5, starts - whole)):
+                    if subset:
+                        tiers.setdefault(round(score + bonus, 2), []).append((subset, None))
+            tiers.setdefault(round(score, 2), []).append((docs, starts))
+
+        results = []
+        for score in sorted(tiers, reverse=True):
+            count = None if limit is None else limit - len(results)
+            docs = [doc_id for subset, excluded in tiers[score] for doc_id in self.shortest(subset, excluded, count)]
+            if len(tiers[score]) > 1:
+                docs = sorted(docs, key=self.lengths.__getitem__)[:count]
+            results.extend((doc_id, score) for doc_id in docs)
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def shortest(self, docs, excluded=None, count=None):
+        """Return doc ids in docs but not in excluded, shortest name first, at most count of them."""
+        if not excluded and count is not None and len(docs) * len(docs) > count * len(self.names):
+            # A large set: walking every name shortest first finds the few needed sooner
+            if self.length_order is None:
+                self.length_order = sorted(self.lengths, key=self.lengths.__getitem__)
+            return list(islice(filter(docs.__contains__, self.length_order), count))
+        if excluded:
+            docs = docs - excluded
+        if count is None:
+            return sorted(docs, key=self.lengths.__getitem__)
+        return heapq.nsmallest(count, docs, key=self.lengths.__getitem__)
+
+    def search(self, query, limit=None, candidates=None):
+        """Return [(doc id, score)] of documents matching every query token, best first.
+
+        candidates, if given, is a set of doc ids the results are restricted to.
+        """
+        groups = self.scored_groups(query)
+        if candidates is not None:
+            groups = [(score, docs & candidates) for score, docs in groups]
+        return self.rank(query, groups, limit)
+
+
+class LibrarySearch:
+    """Search over every app in the cached libraries, with the profiles that own each app."""
+
+    def __init__(self):
+        self.index = NameIndex()
+        self.app_names = {}  # appid -> name as Steam reports it
+        self.owners = {}  # appid -> set of SteamIDs
+        self.libraries = {}  # SteamID -> set of appids
+        self.metadata = {}  # appid -> metadata terms, kept for apps that join a library later
+        self.lock = threading.Lock()
+
+    def update_library(self, steam_id, games):
+        """Apply a refreshed library; only apps gained or lost are touched."""
+        games = {game['appid']: game['name'] for game in games if isinstance(game, dict) and 'appid' in game and 'name' in game}
+        with self.lock:
+            previous = self.libraries.get(steam_id, set())
+            owned = set(games)
+            for appid in previous - owned:
+                self.drop_owner(appid, steam_id)
+            for appid in owned - previous:
+                self.owners.setdefault(appid, set()).add(steam_id)
+            changed = {appid: name for appid, name in games.items() if self.app_names.get(appid) != name}
+            self.app_names.update(changed)
+            self.index.add_many(changed.items(), self.metadata)
+            self.libraries[steam_id] = owned
+
+    def remove_library(self, steam_id):
+        with self.lock:
+            for appid in self.libraries.pop(steam_id, ()):
+                self.drop_owner(appid, steam_id)
+
+    def drop_owner(self, appid, steam_id):
+        # Callers hold self.lock
+        owners = self.owners.get(appid)
+        if owners is None:
+            return
+        owners.discard(steam_id)
+        if not owners:
+            del self.owners[appid]
+            del self.app_names[appid]
+            self.index.remove(appid)
+
+    def set_metadata(self, appid, terms):
+        """Make an app findable by store metadata such as genres and categories."""
+        with self.lock:
+            self.metadata[appid] = tuple(terms)
+            self.index.set_metadata(appid, terms)
+
+    def search(self, query, limit=20, steam_ids=None):
+        """Return ranked apps matching query with their owners, optionally only among steam_ids."""
+        with self.lock:
+            groups = self.index.scored_groups(query)
+            if steam_ids is not None:
+                # Filter the (usually small) match sets rather than building the union of the libraries
+                libraries = [self.libraries.get(steam_id, set()) for steam_id in steam_ids]
+                groups = [(score, set().union(*(docs & library for library in libraries))) for score, docs in groups]
+            results = []
+            for appid, score in self.index.rank(query, groups, limit):
+                owners = self.owners[appid] if steam_ids is None else self.owners[appid] & set(steam_ids)
+                results.append({'appid': appid, 'name': self.app_names[appid], 'score': round(score, 3),
+                                'owners': sorted(owners)})
+            return results
+
+    def library_matches(self, steam_id, query, ranked=False):
+        """Return the appids in one library matching query, as a set or with ranked a list best first.
+
+        Returns None if the library isn't indexed here.
+        """
+        with self.lock:
+            library = self.libraries.get(steam_id)
+            if library is None:
+                return None
+            groups = [(score, docs & library) for score, docs in self.index.scored_groups(query)]
+            if ranked:
+                return [appid for appid, _ in self.index.rank(query, groups)]
+            return set().union(*(docs for _, docs in groups))
+
+    def most_owned(self, limit):
+        """Return the appids owned by the most cached libraries, most owners first."""
+        with self.lock:
+            return heapq.nlargest(limit, self.owners, key=lambda appid: len(self.owners[appid]))
+
+    def stats(self):
+        with self.lock:
+            return {'apps': len(self.index), 'libraries': len(self.libraries), 'tokens': len(self.index.vocabulary)}
@@ -1,14 +1,13 @@
-let allGames = []; // For Top 20 and Recently Played
+let stats = null; // Result of /library_stats for the stats card, chart, Top 20 and Recently Played
 let currentPageGames = []; // For Full List (paginated)
-let friendGames = [];
+let comparison = null; // Result of /compare for the user and friend
 let currentPage = 1;
 let totalPages = 1;
 let totalGames = 0;
+let nextCursor = null; // Cursors into the server's snapshot of the current filtered, sorted list
+let prevCursor = null;
 let showFullLibrary = false; // Track if full library mode is enabled
 const gamesPerPage = 50; // For paginated "Full List"
-const initialFetchPerPage = 2000; // Increased to ensure we fetch all games
-const recentDaysInSeconds = 31 * 24 * 60 * 60; // 31 days for recent games
-const currentTimestamp = Math.floor(Date.now() / 1000);
 let favorites = JSON.parse(localStorage.getItem('favorites')) || [];
 let userUrl = '';
 let steamId = '';
@@ -54,6 +53,7 @@ async function fetchWithRetry(url, options, retries = 3, delay = 5000) {
             if (error.message.includes('400')) {
                 throw new Error('Invalid request (HTTP 400). The SteamID64 may be invalid, the profile may not exist, or it may be private.');
             }
+            if (error.message.includes('410')) throw error; // Expired cursor; retrying won't help
             if (i === retries - 1) throw error;
             console.warn(`Fetch error: ${error.message}. Retrying in ${delay/1000} seconds... (Attempt ${i+1}/${retries})`);
             await new Promise(resolve => setTimeout(resolve, delay));
@@ -97,8 +97,8 @@ async function fetchAndRender() {
     copyButton.style.display = 'none';
     errorMessage.textContent = '';
     currentPage = 1;
-    allGames = [];
-    friendGames = [];
+    stats = null;
+    comparison = null;
 
     if (!userInput) {
         errorMessage.textContent = 'Please enter your username or SteamID64.';
@@ -117,9 +117,12 @@ async function fetchAndRender() {
         `/get_library?username=${encodeURIComponent(userInput)}`;
 
     try {
-        // Fetch the initial library data (for Top 20 and Recently Played)
-        const userData = await fetchWithRetry(`${userUrl}&page=1&per_page=${initialFetchPerPage}`, { mode: 'cors' });
-        console.log('Fetched full data:', userData);
+        // Fetch the aggregates for the dashboard; the server computes them from the whole library
+        const statsUrl = isSteamID ?
+            `/library_stats?steamid=${encodeURIComponent(userInput)}` :
+            `/library_stats?username=${encodeURIComponent(userInput)}`;
+        const userData = await fetchWithRetry(statsUrl, { mode: 'cors' });
+        console.log('Fetched library stats:', userData);
         if (userData.error) {
             errorMessage.textContent = userData.error;
             if (userData.error.includes("Invalid username")) {
@@ -130,9 +133,7 @@ async function fetchAndRender() {
                 errorMessage.textContent += ' The SteamID64 may be incorrect or the profile does not exist.';
             }
         } else {
-            // Filter out invalid game entries
-            allGames = userData.games.filter(game => game && typeof game === 'object' && 'appid' in game && 'name' in game);
-            console.log('Total games fetched in allGames:', allGames.length);
+            stats = userData;
             steamId = userData.steam_id;
             steamIdDisplay.textContent = steamId;
             copyButton.style.display = 'inline';
@@ -151,13 +152,11 @@ async function fetchAndRender() {
     }
 
     if (friendInput) {
-        const friendUrl = /^\d{17}$/.test(friendInput) ?
-            `/get_library_by_id?steamid=${encodeURIComponent(friendInput)}&page=1&per_page=${initialFetchPerPage}` :
-            `/get_library?username=${encodeURIComponent(friendInput)}&page=1&per_page=${initialFetchPerPage}`;
+        // The server diffs both libraries and returns only the comparison
+        const ids = [steamId || userInput, friendInput].map(encodeURIComponent).join(',');
         try {
-            const friendData = await fetchWithRetry(friendUrl, { mode: 'cors' });
-            if (friendData.error) throw new Error(friendData.error);
-            friendGames = friendData.games.filter(game => game && typeof game === 'object' && 'appid' in game && 'name' in game);
+            comparison = await fetchWithRetry(`/compare?ids=${ids}&per_page=10000`, { mode: 'cors' });
+            if (comparison.error) throw new Error(comparison.error);
             renderComparison();
         } catch (error) {
             compareList.innerHTML = `<li>Error fetching friend's library: ${error.message}</li>`;
@@ -165,7 +164,7 @@ async function fetchAndRender() {
     }
 }
 
-async function fetchPaginatedGames(page) {
+async function fetchPaginatedGames(page, cursor = null) {
     showFullLibrary = document.getElementById('showFullLibrary').checked; // Update the flag
     const params = {
         page: showFullLibrary ? 1 : page, // Use page 1 for full library
@@ -180,6 +179,8 @@ async function fetchPaginatedGames(page) {
         dateRange: document.getElementById('dateRange').value,
         exportAll: showFullLibrary // Use exportAll=true when showing full library
     };
+    // A cursor pages through the list the first page was taken from, so pages don't shift or repeat
+    if (cursor && !showFullLibrary) params.cursor = cursor;
     const queryString = Object.keys(params).map(key => `${key}=${encodeURIComponent(params[key])}`).join('&');
     const url = `${userUrl}&${queryString}`;
 
@@ -197,9 +198,15 @@ async function fetchPaginatedGames(page) {
             currentPageGames = userData.games.filter(game => game && typeof game === 'object' && 'appid' in game && 'name' in game);
             totalPages = showFullLibrary ? 1 : userData.total_pages; // Override totalPages in full library mode
             totalGames = userData.total_games;
+            nextCursor = userData.next_cursor;
+            prevCursor = userData.prev_cursor;
             renderGames();
         }
     } catch (error) {
+        if (cursor && error.message.includes('410')) {
+            // The snapshot expired; fall back to the page number, which starts a new one
+            return fetchPaginatedGames(page);
+        }
         document.getElementById('errorMessage').textContent = error.message;
         console.error('Fetch error:', error);
     }
@@ -207,25 +214,15 @@ async function fetchPaginatedGames(page) {
 
 function renderStats() {
     const statsList = document.getElementById('statsList');
-    const totalPlaytime = allGames.reduce((sum, game) => sum + (game.playtime_forever || 0), 0);
-    const totalHours = Math.floor(totalPlaytime / 60);
-    const playedGames = allGames.filter(game => (game.playtime_forever || 0) > 0);
-    const avgPlaytime = playedGames.length > 0 ? Math.floor(totalPlaytime / playedGames.length / 60) : 0;
-    const windowsPlaytime = allGames.reduce((sum, game) => sum + (game.playtime_windows_forever || 0), 0);
-    const macPlaytime = allGames.reduce((sum, game) => sum + (game.playtime_mac_forever || 0), 0);
-    const linuxPlaytime = allGames.reduce((sum, game) => sum + (game.playtime_linux_forever || 0), 0);
-    const deckPlaytime = allGames.reduce((sum, game) => sum + (game.playtime_deck_forever || 0), 0);
-    const mostActivePlatform = [
-        { name: 'Windows', time: windowsPlaytime },
-        { name: 'Mac', time: macPlaytime },
-        { name: 'Linux', time: linuxPlaytime },
-        { name: 'Steam Deck', time: deckPlaytime }
-    ].sort((a, b) => b.time - a.time)[0].name;
+    const platformNames = { windows: 'Windows', mac: 'Mac', linux: 'Linux', deck: 'Steam Deck' };
+    const totalHours = Math.floor(stats.total_playtime / 60);
+    const avgPlaytime = Math.floor(stats.average_playtime / 60);
+    const mostActivePlatform = platformNames[stats.most_active_platform];
 
     statsList.innerHTML = `
         <li>Total Playtime: ${totalHours} hours</li>
-        <li>Total Games: ${allGames.length}</li>
-        <li>Games Played: ${playedGames.length}</li>
+        <li>Total Games: ${stats.total_games}</li>
+        <li>Games Played: ${stats.games_played}</li>
         <li>Average Playtime per Played Game: ${avgPlaytime} hours</li>
         <li>Most Active Platform: ${mostActivePlatform}</li>
     `;
@@ -249,17 +246,10 @@ function renderPlaytimeTrends() {
             playtimeChartInstance = null;
         }
 
-        const monthlyPlaytime = {};
-        allGames.forEach(game => {
-            if (game.rtime_last_played) {
-                const date = new Date(game.rtime_last_played * 1000);
-                const monthYear = `${date.getFullYear()}-${(date.getMonth() + 1).toString().padStart(2, '0')}`;
-                monthlyPlaytime[monthYear] = (monthlyPlaytime[monthYear] || 0) + (game.playtime_forever || 0);
-            }
-        });
-
-        const labels = Object.keys(monthlyPlaytime).sort();
-        const data = labels.map(label => Math.floor(monthlyPlaytime[label] / 60));
+        // Playtime of games grouped by the month they were last played (UTC), already sorted
+        const months = stats ? stats.last_played_months : [];
+        const labels = months.map(bucket => bucket.month);
+        const data = months.map(bucket => Math.floor(bucket.playtime / 60));
 
         if (labels.length === 0) {
             console.log('No data to render chart, skipping...');
@@ -320,10 +310,8 @@ function renderPlaytimeTrends() {
 
 function renderTopGames() {
     const topGamesList = document.getElementById('topGamesList');
-    const topGames = [...allGames]
-        .sort((a, b) => (b.playtime_forever || 0) - (a.playtime_forever || 0))
-        .slice(0, 20);
-    const maxPlaytime = Math.max(...allGames.map(game => game.playtime_forever || 0));
+    const topGames = stats.top_playtime;
+    const maxPlaytime = stats.max_playtime;
 
     topGamesList.innerHTML = '';
     topGames.forEach(game => {
@@ -357,57 +345,10 @@ function renderTopGames() {
 
 function renderRecentGames() {
     const recentGamesList = document.getElementById('recentGamesList');
-    const recentDaysAgo = currentTimestamp - recentDaysInSeconds;
-    console.log('Rendering Recently Played Games...');
-    console.log('Current timestamp:', currentTimestamp, 'Recent days ago:', recentDaysAgo);
-    console.log('Total games in allGames:', allGames.length);
-
-    // Log all games with rtime_last_played, sorted by most recent
-    const gamesWithLastPlayed = allGames
-        .filter(game => game.rtime_last_played)
-        .sort((a, b) => (b.rtime_last_played || 0) - (a.rtime_last_played || 0));
-    console.log('All games with rtime_last_played:', gamesWithLastPlayed.map(game => ({
-        name: game.name,
-        playtime_2weeks: game.playtime_2weeks || 0,
-        rtime_last_played: game.rtime_last_played,
-        lastPlayedDate: new Date(game.rtime_last_played * 1000).toLocaleString()
-    })));
-
-    // Log games within the recent days window
-    const recentCandidates = allGames.filter(game => game.rtime_last_played && game.rtime_last_played >= recentDaysAgo);
-    console.log('Games within the last 31 days:', recentCandidates.map(game => ({
-        name: game.name,
-        playtime_2weeks: game.playtime_2weeks || 0,
-        rtime_last_played: game.rtime_last_played,
-        lastPlayedDate: new Date(game.rtime_last_played * 1000).toLocaleString()
-    })));
-
-    // First, try to find games played within the last 31 days
-    let recentGames = allGames.filter(game => 
-        (game.playtime_2weeks && game.playtime_2weeks > 0) || 
-        (game.rtime_last_played && game.rtime_last_played >= recentDaysAgo)
-    ).sort((a, b) => (b.rtime_last_played || 0) - (a.rtime_last_played || 0));
-
-    // If no games were played in the last 31 days, fall back to the top 10 most recently played games
-    if (recentGames.length === 0) {
-        console.log('No games played in the last 31 days, falling back to most recently played games...');
-        recentGames = allGames
-            .filter(game => game.rtime_last_played) // Only include games with a last played time
-            .sort((a, b) => (b.rtime_last_played || 0) - (a.rtime_last_played || 0))
-            .slice(0, 10); // Take the top 10
-    }
-
-    const maxPlaytime = Math.max(...allGames.map(game => game.playtime_forever || 0));
-
+    // Games played in the last 31 days (or the 10 most recently played), newest first
+    const recentGames = stats.recent;
+    const maxPlaytime = stats.max_playtime;
     console.log('Number of recently played games:', recentGames.length);
-    if (recentGames.length > 0) {
-        console.log('Recently played games:', recentGames.map(game => ({
-            name: game.name,
-            playtime_2weeks: game.playtime_2weeks || 0,
-            rtime_last_played: game.rtime_last_played,
-            lastPlayedDate: game.rtime_last_played ? new Date(game.rtime_last_played * 1000).toLocaleString() : 'Never'
-        })));
-    }
 
     recentGamesList.innerHTML = '';
     if (recentGames.length === 0) {
@@ -446,17 +387,13 @@ function renderRecentGames() {
 
 function renderComparison() {
     const compareList = document.getElementById('compareList');
-    const userGameNames = new Set(allGames.map(game => game.name));
-    const friendGameNames = new Set(friendGames.map(game => game.name));
-
-    const commonGames = [...userGameNames].filter(name => friendGameNames.has(name));
-    const onlyUserGames = [...userGameNames].filter(name => !friendGameNames.has(name));
-    const onlyFriendGames = [...friendGameNames].filter(name => !userGameNames.has(name));
+    const [user, friend] = comparison.profiles.map(profile => profile.steam_id);
+    const names = section => section.games.map(game => game.name).join(', ');
 
     compareList.innerHTML = `
-        <li><strong>Common Games (${commonGames.length}):</strong> ${commonGames.join(', ')}</li>
-        <li><strong>Only in Your Library (${onlyUserGames.length}):</strong> ${onlyUserGames.join(', ')}</li>
-        <li><strong>Only in Friend's Library (${onlyFriendGames.length}):</strong> ${onlyFriendGames.join(', ')}</li>
+        <li><strong>Common Games (${comparison.common.total}):</strong> ${names(comparison.common)}</li>
+        <li><strong>Only in Your Library (${comparison.unique[user].total}):</strong> ${names(comparison.unique[user])}</li>
+        <li><strong>Only in Friend's Library (${comparison.unique[friend].total}):</strong> ${names(comparison.unique[friend])}</li>
     `;
 }
 
@@ -466,7 +403,7 @@ function renderGames() {
     const nextPageButton = document.getElementById('nextPage');
     const pageInfo = document.getElementById('pageInfo');
     const paginationDiv = document.querySelector('.pagination');
-    const maxPlaytime = Math.max(...allGames.map(game => game.playtime_forever || 0));
+    const maxPlaytime = stats ? stats.max_playtime : 0;
 
     gameList.innerHTML = '';
     console.log('Rendering games for page:', currentPage, 'Total games on this page:', currentPageGames.length);
@@ -505,7 +442,7 @@ function renderGames() {
         prevPageButtonClone.addEventListener('click', () => {
             if (currentPage > 1) {
                 currentPage--;
-                fetchPaginatedGames(currentPage);
+                fetchPaginatedGames(currentPage, prevCursor);
                 savePreferences();
                 updateShareableLink();
             }
@@ -513,7 +450,7 @@ function renderGames() {
         nextPageButtonClone.addEventListener('click', () => {
             if (currentPage < totalPages) {
                 currentPage++;
-                fetchPaginatedGames(currentPage);
+                fetchPaginatedGames(currentPage, nextCursor);
                 savePreferences();
                 updateShareableLink();
             }
@@ -547,7 +484,7 @@ function toggleDetails(element) {
 }
 
 function setupLazyLoading() {
-    const maxPlaytime = Math.max(...allGames.map(game => game.playtime_forever || 0));
+    const maxPlaytime = stats ? stats.max_playtime : 0;
     const steamIdDisplay = document.getElementById('steamId');
     const observer = new IntersectionObserver((entries, observer) => {
         entries.forEach(entry => {
@@ -685,10 +622,15 @@ function updateShareableLink() {
     return shareableUrl;
 }
 
-document.getElementById('exportCsv').addEventListener('click', async () => {
-    const params = {
-        page: 1, // Ignored with exportAll, but required by endpoint
-        per_page: 10000, // High value to ensure all games are fetched
+document.getElementById('exportCsv').addEventListener('click', () => {
+    if (!steamId) {
+        document.getElementById('errorMessage').textContent = 'Export failed: load a library first.';
+        return;
+    }
+    // The server streams the filtered, sorted list as CSV, so the browser never holds the full library
+    const params = new URLSearchParams({
+        steamid: steamId,
+        format: 'csv',
         showPlayedOnly: document.getElementById('showPlayedOnly').checked,
         filterWindows: document.getElementById('filterWindows').checked,
         filterMac: document.getElementById('filterMac').checked,
@@ -696,54 +638,12 @@ document.getElementById('exportCsv').addEventListener('click', async () => {
         filterDeck: document.getElementById('filterDeck').checked,
         search: document.getElementById('searchInput').value.trim(),
         sortBy: document.getElementById('sortBy').value,
-        dateRange: document.getElementById('dateRange').value,
-        exportAll: true // Always fetch the full list for export
-    };
-    const queryString = Object.keys(params).map(key => `${key}=${encodeURIComponent(params[key])}`).join('&');
-    const url = `${userUrl}&${queryString}`;
-
-    try {
-        const exportButton = document.getElementById('exportCsv');
-        exportButton.disabled = true;
-        exportButton.textContent = 'Exporting...';
-
-        const fullData = await fetchWithRetry(url, { mode: 'cors' });
-        if (fullData.error) {
-            document.getElementById('errorMessage').textContent = `Export failed: ${fullData.error}`;
-            return;
-        }
-
-        const filteredGames = fullData.games.filter(game => game && typeof game === 'object' && 'appid' in game && 'name' in game);
-        console.log('Exporting CSV with total games:', filteredGames.length);
-
-        const csvContent = [
-            ['Name', 'Playtime (Hours)', 'Last Played', 'Playtime Last 2 Weeks (Hours)'].join(','),
-            ...filteredGames.map(game => {
-                const hours = Math.floor((game.playtime_forever || 0) / 60);
-                const lastPlayed = game.rtime_last_played ? new Date(game.rtime_last_played * 1000).toLocaleDateString() : 'Never';
-                const playtime2Weeks = game.playtime_2weeks ? Math.floor(game.playtime_2weeks / 60) : 0;
-                return [
-                    `"${game.name.replace(/"/g, '""')}"`,
-                    hours,
-                    lastPlayed,
-                    playtime2Weeks
-                ].join(',');
-            })
-        ].join('\n');
-
-        const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
-        const link = document.createElement('a');
-        link.href = URL.createObjectURL(blob);
-        link.download = 'steam_library_full.csv'; // Renamed for clarity
-        link.click();
-    } catch (error) {
-        document.getElementById('errorMessage').textContent = `Export failed: ${error.message}`;
-        console.error('CSV export error:', error);
-    } finally {
-        const exportButton = document.getElementById('exportCsv');
-        exportButton.disabled = false;
-        exportButton.textContent = 'Export to CSV';
-    }
+        dateRange: document.getElementById('dateRange').value
+    });
+    const link = document.createElement('a');
+    link.href = `/export_library?${params.toString()}`;
+    link.download = 'steam_library_full.csv';
+    link.click();
 });
 
 document.getElementById('shareLink').addEventListener('click', () => {
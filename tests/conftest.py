@@ -0,0 +1,149 @@
+"""Shared fixtures: the Flask app on a throwaway database, with Steam replaced by FakeSteam.
+
+app.py reads its configuration at import time, so the environment is set up here,
+before any test module imports it. Background threads stay off.
+"""
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+import requests
+
+DATA_DIR = tempfile.mkdtemp(prefix='steam-library-tests-')
+os.environ.update({
+    'STEAM_API_KEY': 'test-key',
+    'DATABASE_URL': f"sqlite:///{os.path.join(DATA_DIR, 'test.db')}",
+    'BACKGROUND_LOCK_FILE': os.path.join(DATA_DIR, 'background.lock'),
+    'WARMUP_ENABLED': 'false',
+    'HISTORY_SYNC_INTERVAL': '0',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as steam_app  # noqa: E402
+from library_query import ViewSnapshots  # noqa: E402
+from search_index import LibrarySearch  # noqa: E402
+
+STEAM_ID = '76561197960287930'
+USERNAME = 'tester'
+PASSWORD = 'secret'
+
+
+def make_games(count, now=None):
+    now = int(now if now is not None else time.time())
+    return [{'appid': appid, 'name': f'Game {appid}', 'playtime_forever': appid * 10,
+             'playtime_windows_forever': appid * 10, 'playtime_mac_forever': 0, 'playtime_linux_forever': 0,
+             'playtime_deck_forever': 0, 'rtime_last_played': now - appid * 86400, 'playtime_2weeks': 0,
+             'img_icon_url': 'icon'} for appid in range(1, count + 1)]
+
+
+class FakeResponse:
+    def __init__(self, data, status=200):
+        self.status_code = status
+        self.data = data
+        self.content = json.dumps(data).encode()
+        self.headers = {}
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} error", response=self)
+
+
+class FakeSteam:
+    """Stands in for requests.Session.get, answering the Steam endpoints app.py calls.
+
+    down lists URL fragments that fail with a connection error; appdetails maps appids
+    to the payload to return instead of a successful one (e.g. {'success': False}).
+    """
+
+    def __init__(self):
+        self.games = make_games(120)
+        self.vanity = {'someone': STEAM_ID}
+        self.appdetails = {}
+        self.down = set()
+        self.calls = []
+
+    def count(self, fragment):
+        return sum(1 for url in self.calls if fragment in url)
+
+    def get(self, url, timeout=None, **kwargs):
+        self.calls.append(url)
+        if any(fragment in url for fragment in self.down):
+            raise requests.exceptions.ConnectionError(f"{url} unreachable")
+        if 'ResolveVanityURL' in url:
+            name = url.split('vanityurl=')[1]
+            if name in self.vanity:
+                return FakeResponse({'response': {'success': 1, 'steamid': self.vanity[name]}})
+            return FakeResponse({'response': {'success': 42, 'message': 'No match'}})
+        if 'GetOwnedGames' in url:
+            return FakeResponse({'response': {'game_count': len(self.games), 'games': self.games}})
+        if 'appdetails' in url:
+            appid = int(url.split('appids=')[1].split('&')[0])
+            payload = self.appdetails.get(appid, {'success': True, 'data': {
+                'genres': [{'description': 'Action'}], 'categories': [{'description': 'Single-player'}],
+                'release_date': {'date': '1 Jan, 2020'}}})
+            return FakeResponse({str(appid): payload})
+        if 'GetPlayerAchievements' in url:
+            return FakeResponse({'playerstats': {'success': True, 'gameName': 'Game', 'achievements': [
+                {'apiname': 'first', 'achieved': 1}, {'apiname': 'second', 'achieved': 0}]}})
+        return FakeResponse({}, 404)
+
+
+@pytest.fixture
+def steam(monkeypatch):
+    fake = FakeSteam()
+    monkeypatch.setattr(steam_app.session, 'get', fake.get)
+    return fake
+
+
+@pytest.fixture
+def app(steam, monkeypatch):
+    """The app module on an empty database with one user, and no in-memory state from earlier tests."""
+    steam_app.app.config['TESTING'] = True
+    steam_app.limiter.enabled = False
+    monkeypatch.setattr(steam_app, 'library_snapshots',
+                        ViewSnapshots(steam_app.LIBRARY_SNAPSHOT_TTL, steam_app.LIBRARY_SNAPSHOT_MAX_BYTES))
+    monkeypatch.setattr(steam_app, 'library_search', LibrarySearch())
+    steam_app.library_search_loaded.clear()
+    steam_app.library_indexes.clear()
+    steam_app.verified_credentials.clear()
+    with steam_app.app.app_context():
+        steam_app.db.drop_all()
+        steam_app.db.create_all()
+        user = steam_app.User(username=USERNAME)
+        user.set_password(PASSWORD)
+        steam_app.db.session.add(user)
+        steam_app.db.session.commit()
+    return steam_app
+
+
+@pytest.fixture
+def client(app):
+    """A test client whose get/post/delete send the test user's credentials over HTTPS."""
+    credentials = base64.b64encode(f'{USERNAME}:{PASSWORD}'.encode()).decode()
+
+    class Client:
+        def __init__(self):
+            self.client = app.app.test_client()
+            self.headers = {'Authorization': f'Basic {credentials}'}
+
+        def open(self, method, path, headers=None, **kwargs):
+            return self.client.open(path, method=method, headers={**self.headers, **(headers or {})},
+                                    base_url='https://localhost', **kwargs)
+
+        def get(self, path, **kwargs):
+            return self.open('GET', path, **kwargs)
+
+        def post(self, path, **kwargs):
+            return self.open('POST', path, **kwargs)
+
+        def delete(self, path, **kwargs):
+            return self.open('DELETE', path, **kwargs)
+
+    return Client()
@@ -0,0 +1,25 @@
+"""Bulk achievement lookups: the played-games cap and the Web API budget share."""
+from conftest import STEAM_ID
+
+
+def test_played_games_are_capped_to_the_most_played(app, client, steam, monkeypatch):
+    monkeypatch.setattr(app, 'BULK_ACHIEVEMENTS_MAX_PLAYED', 5)
+    response = client.get(f'/get_achievements_bulk?steamid={STEAM_ID}&appids=played')
+    assert response.status_code == 200
+    # playtime_forever grows with the appid, so the five most played are the highest appids
+    assert [game['appid'] for game in response.json['games']] == [120, 119, 118, 117, 116]
+    assert response.json['truncated'] is True
+    assert response.json['summary']['achieved'] == 5
+    assert steam.count('GetPlayerAchievements') == 5
+
+
+def test_explicit_lists_are_not_truncated(client, steam):
+    response = client.get(f'/get_achievements_bulk?steamid={STEAM_ID}&appids=1,2')
+    assert response.status_code == 200
+    assert response.json['truncated'] is False
+    assert steam.count('GetPlayerAchievements') == 2
+
+
+def test_achievements_use_only_their_share_of_the_key_budget(app):
+    assert app.web_api_bucket.rate == app.WEB_API_RATE * app.ACHIEVEMENTS_API_SHARE / app.SERVER_PROCESSES
+    assert app.web_api_bucket.rate < app.WEB_API_RATE
@@ -0,0 +1,77 @@
+"""The verified-credentials cache: invalidation on password changes, renames and the verification race."""
+import pytest
+
+from conftest import PASSWORD, USERNAME
+
+OTHER = 'other'
+
+
+@pytest.fixture
+def users(app):
+    with app.app.app_context():
+        user = app.User(username=OTHER)
+        user.set_password('other-secret')
+        app.db.session.add(user)
+        app.db.session.commit()
+
+    def update(name, **changes):
+        with app.app.app_context():
+            user = app.User.query.filter_by(username=name).first()
+            if 'password' in changes:
+                user.set_password(changes['password'])
+            if 'username' in changes:
+                user.username = changes['username']
+            app.db.session.commit()
+    return update
+
+
+def verify(app, username, password):
+    with app.app.app_context():
+        return app.verify_password(username, password)
+
+
+def cached_users(app):
+    return sorted(username for username, _ in app.verified_credentials.values())
+
+
+def test_password_change_rejects_the_old_password(app, client, users):
+    assert client.get('/warmup_status').status_code == 200
+    assert cached_users(app) == [USERNAME]
+
+    users(USERNAME, password='changed')
+    assert client.get('/warmup_status').status_code == 401
+    assert verify(app, USERNAME, 'changed') == USERNAME
+
+
+def test_changes_only_drop_that_users_entries(app, client, users):
+    verify(app, USERNAME, PASSWORD)
+    verify(app, OTHER, 'other-secret')
+    users(OTHER, password='changed')
+    assert cached_users(app) == [USERNAME]
+
+    verify(app, OTHER, 'changed')
+    users(OTHER, username='renamed')
+    assert cached_users(app) == [USERNAME]
+    assert verify(app, OTHER, 'changed') is None
+
+
+def test_registering_keeps_other_users_cached(app, client):
+    verify(app, USERNAME, PASSWORD)
+    response = client.post('/register', json={'username': 'newcomer', 'password': 'pw'})
+    assert response.status_code == 201
+    assert cached_users(app) == [USERNAME]
+
+
+def test_verification_racing_a_change_is_not_cached(app, users, monkeypatch):
+    check_password = app.User.check_password
+
+    def racing(user, password):
+        valid = check_password(user, password)
+        users(USERNAME, password='changed')  # lands while the old password is being checked
+        return valid
+    monkeypatch.setattr(app.User, 'check_password', racing)
+    assert verify(app, USERNAME, PASSWORD) == USERNAME
+    assert cached_users(app) == []
+
+    monkeypatch.setattr(app.User, 'check_password', check_password)
+    assert verify(app, USERNAME, PASSWORD) is None
@@ -0,0 +1,57 @@
+"""LibraryCache: TTL expiry, forced refreshes and least-recently-used eviction."""
+import pytest
+from sqlalchemy import event
+
+from conftest import STEAM_ID
+
+OTHER_IDS = ['76561197960287931', '76561197960287932']
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app.app_context():
+        yield app
+
+
+def test_library_is_served_from_the_cache_until_the_ttl(ctx, steam):
+    ctx.get_library_index(STEAM_ID, touch=True)
+    ctx.get_library_index(STEAM_ID, touch=True)
+    assert steam.count('GetOwnedGames') == 1
+
+    entry = ctx.db.session.get(ctx.LibraryCache, STEAM_ID)
+    entry.fetched_at -= ctx.LIBRARY_CACHE_TTL
+    ctx.db.session.commit()
+    ctx.get_library_index(STEAM_ID, touch=True)
+    assert steam.count('GetOwnedGames') == 2
+
+
+def test_refresh_refetches_a_fresh_library(client, steam):
+    assert client.get(f'/get_library_by_id?steamid={STEAM_ID}').status_code == 200
+    assert client.get(f'/get_library_by_id?steamid={STEAM_ID}').status_code == 200
+    assert steam.count('GetOwnedGames') == 1
+    assert client.get(f'/get_library_by_id?steamid={STEAM_ID}&refresh=true').status_code == 200
+    assert steam.count('GetOwnedGames') == 2
+
+
+def test_least_recently_used_library_is_evicted(ctx, steam, monkeypatch):
+    ctx.get_library_index(STEAM_ID, touch=True)
+    ctx.get_library_index(OTHER_IDS[0], touch=True)
+    size = ctx.db.session.get(ctx.LibraryCache, STEAM_ID).size_bytes
+    monkeypatch.setattr(ctx, 'LIBRARY_CACHE_MAX_BYTES', size * 2 + size // 2)
+    # The first library was read most recently, so the second is the one to go
+    ctx.db.session.get(ctx.LibraryCache, STEAM_ID).last_accessed += 3600
+    ctx.db.session.commit()
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(ctx.db.engine, 'before_cursor_execute', record)
+    try:
+        ctx.get_library_index(OTHER_IDS[1], touch=True)
+    finally:
+        event.remove(ctx.db.engine, 'before_cursor_execute', record)
+
+    assert {entry.steam_id for entry in ctx.LibraryCache.query} == {STEAM_ID, OTHER_IDS[1]}
+    # Picking what to evict must not read the stored libraries
+    assert not [statement for statement in statements if statement.startswith('SELECT') and 'games_json' in statement]
@@ -0,0 +1,83 @@
+"""Cursor pagination of /get_library: snapshots, rebuilding after eviction and 410 once the library changes."""
+from conftest import STEAM_ID
+from library_query import ViewSnapshots
+
+
+def appids(response):
+    return [game['appid'] for game in response.json['games']]
+
+
+def first_page(client):
+    response = client.get(f'/get_library_by_id?steamid={STEAM_ID}&per_page=25&sortBy=playtime')
+    assert response.status_code == 200
+    assert response.json['next_cursor']
+    return response
+
+
+def test_cursor_walks_the_snapshot_in_order(client, steam):
+    page = first_page(client)
+    seen = appids(page)
+    cursor = page.json['next_cursor']
+    while cursor:
+        page = client.get(f'/get_library_by_id?steamid={STEAM_ID}&cursor={cursor}')
+        assert page.status_code == 200
+        seen += appids(page)
+        cursor = page.json['next_cursor']
+    # playtime_forever grows with the appid, so most played first is descending appids
+    assert seen == sorted((game['appid'] for game in steam.games), reverse=True)
+
+
+def test_cursor_survives_a_library_change_after_the_snapshot(client, steam):
+    cursor = first_page(client).json['next_cursor']
+    expected = appids(client.get(f'/get_library_by_id?steamid={STEAM_ID}&cursor={cursor}'))
+    steam.games[0]['playtime_forever'] = 10 ** 6
+    assert client.get(f'/get_library_by_id?steamid={STEAM_ID}&refresh=true').status_code == 200
+
+    response = client.get(f'/get_library_by_id?steamid={STEAM_ID}&cursor={cursor}')
+    assert response.status_code == 200
+    assert appids(response) == expected
+
+
+def test_evicted_snapshot_is_rebuilt_from_the_cursor(app, client, monkeypatch):
+    cursor = first_page(client).json['next_cursor']
+    expected = appids(client.get(f'/get_library_by_id?steamid={STEAM_ID}&cursor={cursor}'))
+    monkeypatch.setattr(app, 'library_snapshots', ViewSnapshots(app.LIBRARY_SNAPSHOT_TTL, app.LIBRARY_SNAPSHOT_MAX_BYTES))
+    app.library_indexes.clear()
+
+    response = client.get(f'/get_library_by_id?steamid={STEAM_ID}&cursor={cursor}')
+    assert response.status_code == 200
+    assert appids(response) == expected
+
+
+def test_cursor_is_gone_once_the_stored_library_is_refreshed(app, client, monkeypatch):
+    cursor = first_page(client).json['next_cursor']
+    assert client.get(f'/get_library_by_id?steamid={STEAM_ID}&refresh=true').status_code == 200
+    monkeypatch.setattr(app, 'library_snapshots', ViewSnapshots(app.LIBRARY_SNAPSHOT_TTL, app.LIBRARY_SNAPSHOT_MAX_BYTES))
+
+    assert client.get(f'/get_library_by_id?steamid={STEAM_ID}&cursor={cursor}').status_code == 410
+
+
+def test_malformed_cursor_is_rejected(client):
+    assert client.get(f'/get_library_by_id?steamid={STEAM_ID}&cursor=not-a-cursor').status_code == 400
+
+
+def test_totals_follow_a_reused_snapshot(app, client, monkeypatch):
+    first = first_page(client).json
+    # The same view queried again (e.g. a date range a moment later) reuses the live snapshot
+    monkeypatch.setattr(app.LibraryIndex, 'query', lambda self, *args, **kwargs: list(range(50)))
+    again = client.get(f'/get_library_by_id?steamid={STEAM_ID}&per_page=25&sortBy=playtime').json
+    assert (again['total_games'], again['total_pages']) == (first['total_games'], first['total_pages']) == (120, 5)
+    assert appids(client.get(f'/get_library_by_id?steamid={STEAM_ID}&per_page=25&sortBy=playtime')) == \
+        [game['appid'] for game in first['games']]
+
+
+def test_page_past_the_end_links_back_into_the_snapshot(client):
+    response = client.get(f'/get_library_by_id?steamid={STEAM_ID}&per_page=25&page=999')
+    assert response.status_code == 200
+    assert response.json['games'] == []
+    assert response.json['next_cursor'] is None
+
+    previous = client.get(f'/get_library_by_id?steamid={STEAM_ID}&per_page=25&cursor={response.json["prev_cursor"]}')
+    assert previous.status_code == 200
+    assert len(previous.json['games']) == 25
+    assert previous.json['page'] == 4
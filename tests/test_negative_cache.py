@@ -0,0 +1,54 @@
+"""Negative caching of store details and vanity names: what is stored, for how long, and what never is."""
+import time
+
+import pytest
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app.app_context():
+        yield app
+
+
+def test_transport_error_stores_no_details(ctx, steam):
+    steam.down.add('appdetails')
+    assert ctx.fetch_and_store_game_details(10) is None
+    assert ctx.db.session.get(ctx.AppDetails, 10) is None
+
+    details, pending = ctx.get_game_details([10], timeout=5)
+    assert details == {}
+    assert pending == [10]
+
+
+def test_failed_lookup_is_cached_for_the_negative_ttl(ctx, steam):
+    steam.appdetails[20] = {'success': False}
+    assert ctx.fetch_and_store_game_details(20) == {}
+    entry = ctx.db.session.get(ctx.AppDetails, 20)
+    assert entry.success is False
+
+    now = entry.fetched_at
+    assert not entry.is_stale(now + ctx.APP_DETAILS_NEGATIVE_TTL - 1)
+    assert entry.is_stale(now + ctx.APP_DETAILS_NEGATIVE_TTL)
+    assert ctx.APP_DETAILS_NEGATIVE_TTL < ctx.APP_DETAILS_TTL
+
+
+def test_unknown_vanity_name_is_cached_until_the_negative_ttl(ctx, steam):
+    assert ctx.resolve_vanity_name('nobody')[1][1] == 404
+    assert ctx.resolve_vanity_name('nobody')[1][1] == 404
+    assert steam.count('ResolveVanityURL') == 1
+
+    entry = ctx.db.session.get(ctx.VanityCache, 'nobody')
+    entry.resolved_at = time.time() - ctx.VANITY_NEGATIVE_TTL
+    ctx.db.session.commit()
+    steam.vanity['nobody'] = '76561197960287931'
+    assert ctx.resolve_vanity_name('nobody') == ('76561197960287931', None)
+    assert steam.count('ResolveVanityURL') == 2
+
+
+def test_vanity_transport_error_is_not_cached(ctx, steam):
+    steam.down.add('ResolveVanityURL')
+    assert ctx.resolve_vanity_name('someone')[1][1] == 500
+    assert ctx.db.session.get(ctx.VanityCache, 'someone') is None
+
+    steam.down.clear()
+    assert ctx.resolve_vanity_name('someone')[1] is None
@@ -0,0 +1,56 @@
+"""Playtime history: the first snapshot is only a baseline, later ones record per-game deltas."""
+import pytest
+
+from conftest import STEAM_ID, make_games
+
+
+@pytest.fixture
+def watched(app, client, monkeypatch):
+    monkeypatch.setattr(app, 'HISTORY_SYNC_INTERVAL', 0)  # every watched profile is due
+    assert client.post('/watched_profiles', json={'steamid': STEAM_ID}).status_code in (200, 201)
+
+    def sync():
+        with app.app.app_context():
+            app.sync_watched_profiles()
+    return sync
+
+
+def history(client):
+    response = client.get(f'/playtime_history?steamid={STEAM_ID}&start=0&bucket=none')
+    assert response.status_code == 200
+    return response.json
+
+
+def test_first_snapshot_is_only_a_baseline(client, watched):
+    watched()
+    result = history(client)
+    assert result['history_starts_at'] is not None
+    assert result['totals']['playtime'] == 0
+    assert result['games'] == []
+
+
+def test_later_snapshots_record_changes_and_new_games(client, steam, watched):
+    watched()
+    steam.games[0]['playtime_forever'] += 30
+    steam.games[0]['playtime_windows_forever'] += 30
+    new_game = make_games(1)[0]
+    steam.games.append(dict(new_game, appid=999, name='New Game', playtime_forever=15, playtime_windows_forever=15))
+    watched()
+
+    result = history(client)
+    assert result['totals']['playtime'] == 45
+    assert result['totals']['playtime_windows'] == 45
+    assert {game['appid']: game['playtime'] for game in result['games']} == {steam.games[0]['appid']: 30, 999: 15}
+
+    # An unchanged library adds nothing
+    watched()
+    assert history(client)['totals']['playtime'] == 45
+
+
+def test_history_needs_a_snapshot(client):
+    assert client.get(f'/playtime_history?steamid={STEAM_ID}').status_code == 404
+
+
+@pytest.mark.parametrize('window', ['start=nan', 'end=inf', 'start=-inf', 'start=10&end=5'])
+def test_invalid_windows_are_rejected(client, window):
+    assert client.get(f'/playtime_history?steamid={STEAM_ID}&{window}').status_code == 400
@@ -0,0 +1,67 @@
+"""The SQLite Flask-Limiter storage: fixed windows, expiry and counters shared between processes."""
+import types
+
+import pytest
+from limits import RateLimitItemPerMinute
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+import ratelimit_storage
+from ratelimit_storage import SQLiteStorage
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    clock.time = lambda: clock.now
+    monkeypatch.setattr(ratelimit_storage, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def uri(tmp_path):
+    return f"sqlite:///{tmp_path / 'ratelimits.db'}"
+
+
+def test_scheme_is_registered(uri):
+    assert isinstance(storage_from_string(uri), SQLiteStorage)
+
+
+def test_window_counts_until_it_expires(uri, clock):
+    storage = SQLiteStorage(uri)
+    assert storage.incr('key', 60) == 1
+    assert storage.incr('key', 60, amount=2) == 3
+    assert storage.get('key') == 3
+    assert storage.get_expiry('key') == 1060
+
+    clock.now = 1059.9
+    assert storage.get('key') == 3
+    clock.now = 1060
+    assert storage.get('key') == 0
+    assert storage.get_expiry('key') == 1060
+    # The first hit after expiry starts a new window
+    assert storage.incr('key', 60) == 1
+    assert storage.get_expiry('key') == 1120
+
+
+def test_counters_are_shared_through_the_file(uri, clock):
+    first, second = SQLiteStorage(uri), SQLiteStorage(uri)
+    first.incr('key', 60)
+    second.incr('key', 60)
+    assert first.get('key') == second.get('key') == 2
+    assert second.get_expiry('key') == 1060
+
+    second.clear('key')
+    assert first.get('key') == 0
+
+
+def test_fixed_window_limiter(uri, clock):
+    limiter = FixedWindowRateLimiter(SQLiteStorage(uri))
+    limit = RateLimitItemPerMinute(2)
+    assert limiter.hit(limit, 'client')
+    assert limiter.hit(limit, 'client')
+    assert not limiter.hit(limit, 'client')
+    assert limiter.hit(limit, 'other-client')
+
+    clock.now += 60
+    assert limiter.hit(limit, 'client')
@@ -0,0 +1,95 @@
+"""Name search ranking, typo tolerance and the symbol-only fallback."""
+import pytest
+
+from conftest import STEAM_ID
+from search_index import LibrarySearch, NameIndex
+
+NAMES = {
+    1: 'Portal',
+    2: 'Portal 2',
+    3: 'Portal Knights',
+    4: 'The Witcher® 3: Wild Hunt',
+    5: 'Teleportal Rush',
+    6: 'C++ Game Maker',
+    7: 'Hello World!',
+    8: 'Pokémon Quest',
+}
+
+
+@pytest.fixture
+def index():
+    index = NameIndex()
+    index.add_many(NAMES.items())
+    return index
+
+
+def ids(results):
+    return [doc_id for doc_id, _ in results]
+
+
+def test_exact_name_then_prefix_then_infix(index):
+    # The whole name first, names starting with the query by length, then the infix match
+    assert ids(index.search('portal')) == [1, 2, 3, 5]
+
+
+def test_names_are_normalised(index):
+    assert ids(index.search('witcher 3')) == [4]
+    assert ids(index.search('pokemon')) == [8]
+
+
+def test_typo_falls_back_to_fuzzy_matches(index):
+    assert ids(index.search('witchr')) == [4]
+    assert index.search('witchr')[0][1] < index.search('witcher')[0][1]
+
+
+def test_every_query_token_must_match(index):
+    assert ids(index.search('portal knights')) == [3]
+    assert index.search('portal zebra') == []
+
+
+@pytest.mark.parametrize('query, expected', [('++', {6}), ('!', {7}), ('  ', set()), ('#', set())])
+def test_symbol_only_queries_scan_names(index, query, expected):
+    assert set(ids(index.search(query))) == expected
+    assert index.match(query) == expected
+
+
+def test_removed_documents_are_not_found(index):
+    index.remove(6)
+    index.remove(2)
+    assert index.search('++') == []
+    assert ids(index.search('portal')) == [1, 3, 5]
+
+
+def test_library_search_restricts_owners():
+    search = LibrarySearch()
+    search.update_library('a', [{'appid': 1, 'name': 'Portal'}, {'appid': 2, 'name': 'Portal 2'}])
+    search.update_library('b', [{'appid': 2, 'name': 'Portal 2'}])
+
+    assert [(result['appid'], result['owners']) for result in search.search('portal')] == [(1, ['a']), (2, ['a', 'b'])]
+    assert [result['appid'] for result in search.search('portal', steam_ids=['b'])] == [2]
+
+    search.remove_library('a')
+    assert [result['appid'] for result in search.search('portal')] == [2]
+    assert search.most_owned(5) == [2]
+
+
+def test_two_character_fragments_match_inside_words(index):
+    assert ids(index.search('rt')) == [1, 2, 3, 5]
+    assert ids(index.search('ch 3')) == [4]
+
+
+def test_library_matches_are_restricted_to_one_library():
+    search = LibrarySearch()
+    search.update_library('a', [{'appid': 1, 'name': 'Portal'}, {'appid': 3, 'name': 'Portal Knights'}])
+    search.update_library('b', [{'appid': 2, 'name': 'Portal 2'}])
+
+    assert search.library_matches('a', 'portal') == {1, 3}
+    assert search.library_matches('a', 'portal', ranked=True) == [1, 3]
+    assert search.library_matches('c', 'portal') is None
+
+
+def test_library_search_filter_uses_the_shared_index(app, client):
+    response = client.get(f'/get_library_by_id?steamid={STEAM_ID}&search=me 1&sortBy=relevance&per_page=3')
+    assert response.status_code == 200
+    assert [game['name'] for game in response.json['games']] == ['Game 1', 'Game 10', 'Game 11']
+    assert app.library_indexes[STEAM_ID].name_index is None
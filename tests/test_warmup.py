@@ -0,0 +1,131 @@
+"""Warm-up scheduling: priorities, exponential backoff, rate limits and the app's store-details job."""
+import pytest
+
+import warmup as warmup_module
+from upstream import RateLimited
+from warmup import WarmupScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Bucket:
+    def __init__(self):
+        self.acquired = self.rewarded = 0
+        self.penalties = []
+
+    def acquire(self):
+        self.acquired += 1
+
+    def reward(self):
+        self.rewarded += 1
+
+    def penalize(self, retry_after=None):
+        self.penalties.append(retry_after)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(warmup_module.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def scheduler(clock):
+    return WarmupScheduler(lambda: False, backoff=60, max_backoff=200)
+
+
+def test_jobs_run_by_priority_then_rank(scheduler):
+    ran = []
+    scheduler.register('job', ran.append)
+    scheduler.enqueue('job', 'popular', 2, 0)
+    scheduler.enqueue('job', 'recent-old', 1, 5)
+    scheduler.enqueue('job', 'recent-new', 1, 9)
+    scheduler.enqueue('job', 'linked', 0, 0)
+    while scheduler.run_once():
+        pass
+    assert ran == ['linked', 'recent-old', 'recent-new', 'popular']
+
+
+def test_requeueing_only_raises_priority(scheduler):
+    assert scheduler.enqueue('job', 'a', 2)
+    assert not scheduler.enqueue('job', 'a', 2)
+    assert scheduler.enqueue('job', 'a', 0)
+    assert scheduler.snapshot()['next'] == [{'kind': 'job', 'key': 'a', 'priority': 0, 'rank': 0}]
+
+
+def test_failures_back_off_exponentially_up_to_the_cap(scheduler, clock):
+    bucket = Bucket()
+    scheduler.register('job', lambda key: 'upstream error', bucket)
+    delays = []
+    for _ in range(4):
+        assert scheduler.enqueue('job', 'a', 0)
+        scheduler.run_once()
+        _, until = scheduler.retry_at[('job', 'a')]
+        delays.append(until - clock.now)
+        assert not scheduler.enqueue('job', 'a', 0)
+        clock.now = until
+    assert delays == [60, 120, 200, 200]
+    assert bucket.rewarded == 0
+    assert scheduler.job_counts() == {('job', 'failed'): 4}
+
+
+def test_success_clears_the_backoff_and_rewards_buckets(scheduler, clock):
+    bucket = Bucket()
+    outcomes = iter(['upstream error', None])
+    scheduler.register('job', lambda key: next(outcomes), bucket)
+    scheduler.enqueue('job', 'a', 0)
+    scheduler.run_once()
+    clock.now += 60
+    scheduler.enqueue('job', 'a', 0)
+    scheduler.run_once()
+    assert ('job', 'a') not in scheduler.retry_at
+    assert (bucket.acquired, bucket.rewarded) == (2, 1)
+    assert scheduler.enqueue('job', 'a', 0)
+
+
+def test_rate_limits_penalize_buckets_and_wait_retry_after(scheduler, clock):
+    bucket = Bucket()
+
+    def limited(key):
+        raise RateLimited(30)
+    scheduler.register('job', limited, bucket)
+    scheduler.enqueue('job', 'a', 0)
+    scheduler.run_once()
+    assert bucket.penalties == [30]
+    failures, until = scheduler.retry_at[('job', 'a')]
+    assert (failures, until - clock.now) == (0, 30)
+    assert scheduler.snapshot()['recent'][0]['outcome'] == 'rate_limited'
+
+
+def test_store_details_job_fails_without_details(app, steam):
+    steam.appdetails[30] = {'success': False}
+    assert app.warm_app_details(30)
+    steam.down.add('appdetails')
+    assert app.warm_app_details(40)
+    steam.down.clear()
+    assert app.warm_app_details(40) is None
+
+
+def test_only_user_requests_pause_warmup(app, monkeypatch):
+    # Refreshes and abandoned fetches sit in the fetcher queues with no user waiting on them
+    monkeypatch.setattr(app.details_refresher, 'inflight', {1: None})
+    monkeypatch.setattr(app.details_fetcher, 'inflight', {2: None})
+    assert app.user_requests_waiting() is False
+    monkeypatch.setattr(app, 'active_user_requests', 1)
+    assert app.user_requests_waiting() is True
+
+
+def test_job_counts_are_exported_as_a_counter(app, client):
+    app.warmup.register('test-job', lambda key: None)
+    app.warmup.enqueue('test-job', 'a', 0)
+    app.warmup.run_once()
+    body = client.get('/metrics').get_data(as_text=True)
+    assert '# TYPE warmup_jobs_total counter' in body
+    assert 'warmup_jobs_total{kind="test-job",outcome="done"} 1' in body
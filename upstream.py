@@ -0,0 +1,183 @@
+"""Concurrency and rate-limiting helpers for calls to the Steam APIs."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+
+
+class RateLimited(Exception):
+    """Raised by a fetch function when upstream answers 429 Too Many Requests."""
+
+    def __init__(self, retry_after=None):
+        super().__init__("Upstream rate limit exceeded")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Thread-safe token bucket whose refill rate backs off on 429s and recovers on success."""
+
+    def __init__(self, rate, capacity, min_rate=None):
+        self.base_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate or rate / 16
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def penalize(self, retry_after=None):
+        """Halve the rate and pause all callers after upstream reports a rate limit."""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+            pause = retry_after if retry_after else 1 / self.rate
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+
+    def reward(self):
+        """Creep back toward the configured rate after a successful call."""
+        with self.lock:
+            if self.rate < self.base_rate:
+                self.rate = min(self.base_rate, self.rate + self.base_rate / 20)
+
+
+class ConcurrentFetcher:
+    """Runs fetch(item) on a bounded worker pool, gated by a shared TokenBucket.
+
+    Calls that raise RateLimited are retried up to max_attempts times after the
+    bucket has backed off. Concurrent submissions of the same item share one call.
+    A background fetcher can be given yield_to, another fetcher whose queued calls
+    must drain before it takes a token, and max_pending, beyond which submissions
+    are dropped.
+    """
+
+    def __init__(self, fetch, bucket, max_workers, max_attempts=4, name='fetcher', yield_to=None, max_pending=None,
+                 idle_poll=0.05):
+        self.fetch = fetch
+        self.bucket = bucket
+        self.max_attempts = max_attempts
+        self.yield_to = yield_to
+        self.max_pending = max_pending
+        self.idle_poll = idle_poll
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def _call(self, item):
+        for attempt in range(1, self.max_attempts + 1):
+            if self.yield_to is not None:
+                while self.yield_to.inflight:
+                    time.sleep(self.idle_poll)
+            self.bucket.acquire()
+            try:
+                result = self.fetch(item)
+            except RateLimited as e:
+                self.bucket.penalize(e.retry_after)
+                if attempt == self.max_attempts:
+                    raise
+                continue
+            self.bucket.reward()
+            return result
+
+    def _done(self, item, future):
+        with self.lock:
+            if self.inflight.get(item) is future:
+                del self.inflight[item]
+
+    def submit(self, item):
+        """Queue item (or join the call already queued for it) and return its Future.
+
+        Returns None if max_pending calls are already queued.
+        """
+        with self.lock:
+            future = self.inflight.get(item)
+            if future is not None:
+                return future
+            if self.max_pending is not None and len(self.inflight) >= self.max_pending:
+                return None
+            future = self.executor.submit(self._call, item)
+            self.inflight[item] = future
+        # Outside the lock: the callback runs immediately if the call has already finished
+        future.add_done_callback(lambda future, item=item: self._done(item, future))
+        return future
+
+    def imap_unordered(self, items, timeout=None):
+        """Yield (item, result) pairs as calls complete; failed calls yield (item, None).
+
+        Stops early once timeout seconds have passed; unfinished calls keep running.
+        """
+        futures = {self.submit(item): item for item in items}
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    print(f"Fetch failed for {futures[future]}: {e}")
+                    yield futures[future], None
+        except FuturesTimeoutError:
+            return
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls that share a key into one in-flight call.
+
+    The first caller for a key runs fn; callers arriving while it is running wait
+    for it and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.executed = 0
+        self.collapsed = 0
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.collapsed += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+        return call.result
+
+    def stats(self):
+        with self.lock:
+            return {'executed': self.executed, 'collapsed': self.collapsed, 'in_flight': len(self.calls)}
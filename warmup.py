@@ -0,0 +1,187 @@
+"""Background scheduler that refreshes likely-to-be-requested data before users ask for it.
+
+Jobs are (kind, key) pairs queued with a priority; lower priorities run first and,
+within a priority, lower ranks (e.g. older cache entries) first. Each kind has a
+handler and the token buckets a job must take a token from, so warm-up traffic stays
+within its share of the upstream quota. The worker waits while busy() reports
+user-facing requests, and a job that fails is not queued again until its backoff
+has passed.
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+from upstream import RateLimited
+
+
+class WarmupScheduler:
+    """Runs queued warm-up jobs one at a time on a daemon thread."""
+
+    def __init__(self, busy, idle_poll=0.05, backoff=60, max_backoff=6 * 60 * 60, history=20):
+        self.busy = busy
+        self.idle_poll = idle_poll
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.handlers = {}  # kind -> (handler, token buckets)
+        self.queue = []  # heap of (priority, rank, seq, kind, key); superseded entries are skipped
+        self.queued = {}  # (kind, key) -> (priority, rank) of its live heap entry
+        self.retry_at = {}  # (kind, key) -> (consecutive failures, monotonic time it may be queued again)
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = None  # (kind, key, started monotonic time)
+        self.paused_since = None
+        self.paused_seconds = 0.0
+        self.counts = {}  # (kind, outcome) -> jobs
+        self.recent = deque(maxlen=history)
+        self.last_plan = None
+
+    def register(self, kind, handler, *buckets):
+        """handler(key) returns None on success or an error message; it may raise RateLimited."""
+        self.handlers[kind] = (handler, buckets)
+
+    def enqueue(self, kind, key, priority, rank=0):
+        """Queue a job; return False if it is already queued at least as urgently, running or backing off."""
+        job = (kind, key)
+        with self.lock:
+            retry = self.retry_at.get(job)
+            if retry is not None and retry[1] > time.monotonic():
+                return False
+            current = self.queued.get(job)
+            if current is not None and current <= (priority, rank):
+                return False
+            if self.running is not None and self.running[:2] == job:
+                return False
+            self.queued[job] = (priority, rank)
+            heapq.heappush(self.queue, (priority, rank, next(self.seq), kind, key))
+        self.wakeup.set()
+        return True
+
+    def pop(self):
+        with self.lock:
+            while self.queue:
+                priority, rank, _, kind, key = heapq.heappop(self.queue)
+                if self.queued.get((kind, key)) == (priority, rank):
+                    del self.queued[(kind, key)]
+                    self.running = (kind, key, time.monotonic())
+                    return kind, key
+            return None
+
+    def wait_while_busy(self):
+        if not self.busy():
+            return
+        self.paused_since = time.monotonic()
+        while self.busy():
+            time.sleep(self.idle_poll)
+        self.paused_seconds += time.monotonic() - self.paused_since
+        self.paused_since = None
+
+    def run_once(self):
+        """Run the most urgent queued job; return False if the queue was empty."""
+        job = self.pop()
+        if job is None:
+            return False
+        kind, key = job
+        handler, buckets = self.handlers[kind]
+        started = time.monotonic()
+        retry_after = None
+        try:
+            self.wait_while_busy()
+            for bucket in buckets:
+                bucket.acquire()
+            # Taking tokens can take a while; let requests that arrived meanwhile go first
+            self.wait_while_busy()
+            started = time.monotonic()
+            error = handler(key)
+            outcome = 'failed' if error else 'done'
+        except RateLimited as e:
+            for bucket in buckets:
+                bucket.penalize(e.retry_after)
+            error = str(e)
+            outcome = 'rate_limited'
+            retry_after = e.retry_after or self.backoff
+        except Exception as e:
+            error = str(e)
+            outcome = 'failed'
+
+        finished = time.monotonic()
+        with self.lock:
+            self.running = None
+            self.counts[(kind, outcome)] = self.counts.get((kind, outcome), 0) + 1
+            if outcome == 'done':
+                self.retry_at.pop(job, None)
+                for bucket in buckets:
+                    bucket.reward()
+            elif outcome == 'rate_limited':
+                failures = self.retry_at.get(job, (0, 0))[0]
+                self.retry_at[job] = (failures, finished + retry_after)
+            else:
+                failures = self.retry_at.get(job, (0, 0))[0] + 1
+                self.retry_at[job] = (failures, finished + min(self.max_backoff, self.backoff * 2 ** (failures - 1)))
+            self.recent.appendleft({'kind': kind, 'key': key, 'outcome': outcome, 'error': error,
+                                    'seconds': round(finished - started, 3), 'finished_at': time.time()})
+        if error:
+            print(f"Warm-up {kind} {key} {outcome}: {error}")
+        return True
+
+    def run(self, plan, plan_interval):
+        """Worker loop: call plan() every plan_interval seconds to queue jobs and run them in between."""
+        next_plan = 0
+        while True:
+            if time.monotonic() >= next_plan:
+                try:
+                    plan()
+                    self.last_plan = time.time()
+                except Exception as e:
+                    print(f"Warm-up planning error: {str(e)}")
+                next_plan = time.monotonic() + plan_interval
+            if not self.run_once():
+                self.wakeup.wait(max(0, next_plan - time.monotonic()))
+                self.wakeup.clear()
+
+    def start(self, plan, plan_interval):
+        threading.Thread(target=self.run, args=(plan, plan_interval), name='warmup', daemon=True).start()
+
+    def stats(self):
+        with self.lock:
+            return {'queued': len(self.queued), 'backing_off': sum(1 for _, until in self.retry_at.values()
+                                                                   if until > time.monotonic())}
+
+    def job_counts(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def snapshot(self, limit=20):
+        """Return the queue state for inspection: the next jobs, the running one and per-kind totals."""
+        now = time.monotonic()
+        with self.lock:
+            live = sorted((priority, rank, seq, kind, key) for priority, rank, seq, kind, key in self.queue
+                          if self.queued.get((kind, key)) == (priority, rank))
+            queued = {}
+            for priority, _, _, kind, _ in live:
+                by_priority = queued.setdefault(kind, {})
+                by_priority[priority] = by_priority.get(priority, 0) + 1
+            counts = {}
+            for (kind, outcome), count in self.counts.items():
+                counts.setdefault(kind, {})[outcome] = count
+            backing_off = sorted(((until - now, kind, key, failures)
+                                  for (kind, key), (failures, until) in self.retry_at.items() if until > now),
+                                 key=lambda item: item[0])
+            running = self.running
+            paused = self.paused_seconds + (now - self.paused_since if self.paused_since is not None else 0)
+            return {
+                'queued': len(live),
+                'queued_by_kind': queued,
+                'next': [{'kind': kind, 'key': key, 'priority': priority, 'rank': rank}
+                         for priority, rank, _, kind, key in live[:limit]],
+                'running': {'kind': running[0], 'key': running[1], 'seconds': round(now - running[2], 3)} if running else None,
+                'paused': self.paused_since is not None,
+                'paused_seconds': round(paused, 3),
+                'backing_off': [{'kind': kind, 'key': key, 'failures': failures, 'retry_in': round(seconds, 1)}
+                                for seconds, kind, key, failures in backing_off[:limit]],
+                'jobs': counts,
+                'recent': list(self.recent)[:limit],
+                'last_plan_at': self.last_plan,
+            }